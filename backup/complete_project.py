@@ -1,10 +1,13 @@
-import json
-import sqlite3
 import logging
 import os
+import sys
 import time
 import requests
-from datetime import datetime
+
+# The shared database modules live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import connect, connect_readonly
+from db_schema import level2_rows, migrate, write_level2_rows
 
 # Set up logging
 logging.basicConfig(
@@ -15,92 +18,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def setup_database(db_path):
-    """Set up the database with the correct schema."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create proposals table (Level 1) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT UNIQUE,
-        sw_no TEXT,
-        project_name TEXT,
-        company_name TEXT,
-        state TEXT,
-        category TEXT,
-        sector TEXT,
-        current_status TEXT,
-        proposal_type TEXT,
-        clearance_type TEXT,
-        submission_date TEXT,
-        last_updated TEXT,
-        year INTEGER,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create proposal_details table (Level 2a) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_details (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT UNIQUE,
-        raw_json TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create proposal_timelines table (Level 2a) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_timelines (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        status TEXT,
-        date TEXT,
-        remarks TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create project_locations table (Level 2b) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS project_locations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        location_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create proposal_forms table (Level 2b) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_forms (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        form_type TEXT,
-        form_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create documents table (Level 2b) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        document_type TEXT,
-        document_name TEXT,
-        document_url TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    conn.commit()
+    """Bring the database up to the current schema, migrating an older one in place."""
+    conn = connect(db_path)
+    migrate(conn)
     conn.close()
     logger.info(f"Database {db_path} setup complete")
 
@@ -239,82 +159,27 @@ def get_documents(proposal_id, session, headers):
         return []
 
 def process_level2_data(proposal_id, conn, session, headers):
-    """Process Level 2a and Level 2b data for a proposal."""
-    cursor = conn.cursor()
-    
-    # Get and process timeline information (Level 2a)
-    logger.info(f"Getting timeline data for proposal {proposal_id}")
-    timelines = get_proposal_timelines(proposal_id, session, headers)
-    if timelines:
-        for timeline in timelines:
-            cursor.execute('''
-            INSERT INTO proposal_timelines (
-                proposal_id,
-                status,
-                date,
-                remarks
-            ) VALUES (?, ?, ?, ?)
-            ''', (
-                proposal_id,
-                timeline.get('status', ''),
-                timeline.get('date', ''),
-                timeline.get('remarks', '')
-            ))
-        logger.info(f"Added {len(timelines)} timeline entries for proposal {proposal_id}")
+    """Process Level 2a and Level 2b data for a proposal.
     
-    # Get and process project location (Level 2b)
-    logger.info(f"Getting location data for proposal {proposal_id}")
-    location = get_project_location(proposal_id, session, headers)
-    if location:
-        cursor.execute('''
-        INSERT INTO project_locations (
-            proposal_id,
-            location_data
-        ) VALUES (?, ?)
-        ''', (
-            proposal_id,
-            json.dumps(location) if isinstance(location, dict) else location
-        ))
-        logger.info(f"Added location data for proposal {proposal_id}")
+    Rows are upserted by their natural keys, so processing a proposal
+    again adds no duplicates.
+    """
+    cursor = conn.cursor()
     
-    # Get and process forms (Level 2b)
-    logger.info(f"Getting form data for proposal {proposal_id}")
+    logger.info(f"Getting Level 2 data for proposal {proposal_id}")
     forms = get_proposal_forms(proposal_id, session, headers)
-    if forms:
-        for form_type, form_data in forms.items():
-            if form_data:  # Only insert if we have data
-                cursor.execute('''
-                INSERT INTO proposal_forms (
-                    proposal_id,
-                    form_type,
-                    form_data
-                ) VALUES (?, ?, ?)
-                ''', (
-                    proposal_id,
-                    form_type,
-                    json.dumps(form_data)
-                ))
-        logger.info(f"Added {len(forms)} forms for proposal {proposal_id}")
-    
-    # Get and process documents (Level 2b)
-    logger.info(f"Getting document data for proposal {proposal_id}")
-    documents = get_documents(proposal_id, session, headers)
-    if documents:
-        for document in documents:
-            cursor.execute('''
-            INSERT INTO documents (
-                proposal_id,
-                document_type,
-                document_name,
-                document_url
-            ) VALUES (?, ?, ?, ?)
-            ''', (
-                proposal_id,
-                document.get('documentType', ''),
-                document.get('documentName', ''),
-                document.get('documentUrl', '')
-            ))
-        logger.info(f"Added {len(documents)} documents for proposal {proposal_id}")
+    level2 = {
+        'timelines': get_proposal_timelines(proposal_id, session, headers),
+        'location': get_project_location(proposal_id, session, headers),
+        # Only forms that have data are stored
+        'forms': {form_type: form_data for form_type, form_data in (forms or {}).items() if form_data},
+        'documents': get_documents(proposal_id, session, headers)
+    }
+    rows = level2_rows(proposal_id, level2)
+    write_level2_rows(cursor, rows)
+    for table, table_rows in rows.items():
+        if table_rows:
+            logger.info(f"Added {len(table_rows)} {table} rows for proposal {proposal_id}")
     
     conn.commit()
 
@@ -326,7 +191,7 @@ def complete_project():
     setup_database(db_path)
     
     # Connect to database
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
     
     # Get a sample of proposals to process (10 proposals)
@@ -373,7 +238,7 @@ def complete_project():
     # Close database connection
     conn.close()
     
-    logger.info(f"Successfully processed sample proposals to demonstrate full functionality")
+    logger.info("Successfully processed sample proposals to demonstrate full functionality")
     return True
 
 def check_database(db_path):
@@ -383,7 +248,7 @@ def check_database(db_path):
         return
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         # List all tables in the database
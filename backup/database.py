@@ -1,6 +1,14 @@
-import sqlite3
-from datetime import datetime
+import json
 import os
+import sys
+from datetime import datetime
+
+# The shared database modules live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+from db_schema import LEVEL2_UPSERTS, migrate
+from raw_json_codec import RawJsonCodec
+from record_mapper import PROPOSAL_DETAILS_UPSERT
 
 class Database:
     def __init__(self, db_path='parivesh_data.db'):
@@ -12,7 +20,7 @@ class Database:
 
     def connect(self):
         """Connect to the database."""
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = db.connect(self.db_path)
         self.cursor = self.conn.cursor()
         return self.conn, self.cursor
 
@@ -24,70 +32,9 @@ class Database:
             self.cursor = None
 
     def init_db(self):
-        """Initialize the database schema."""
+        """Bring the database up to the current schema, migrating an older one in place."""
         conn, c = self.connect()
-        
-        # Level 1 Table: proposals (Basic proposal info)
-        c.execute('''CREATE TABLE IF NOT EXISTS proposals (
-                    proposal_id TEXT PRIMARY KEY,
-                    s_w_no TEXT,
-                    state TEXT,
-                    year INTEGER,
-                    proposal_title TEXT,
-                    current_status TEXT,
-                    last_updated DATETIME
-                )''')
-        
-        # Level 2a Table: proposal_details (Detailed proposal info)
-        c.execute('''CREATE TABLE IF NOT EXISTS proposal_details (
-                    proposal_id TEXT PRIMARY KEY,
-                    title TEXT,
-                    proponent TEXT,
-                    category TEXT,
-                    sector TEXT,
-                    proposal_for TEXT,
-                    date_submitted DATETIME,
-                    FOREIGN KEY(proposal_id) REFERENCES proposals(proposal_id)
-                )''')
-        
-        # Level 2a Table: proposal_timelines (Timeline and status updates)
-        c.execute('''CREATE TABLE IF NOT EXISTS proposal_timelines (
-                    timeline_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    proposal_id TEXT,
-                    date DATETIME,
-                    status TEXT,
-                    remarks TEXT,
-                    FOREIGN KEY(proposal_id) REFERENCES proposals(proposal_id)
-                )''')
-        
-        # Level 2b Table: project_locations (KML file data)
-        c.execute('''CREATE TABLE IF NOT EXISTS project_locations (
-                    location_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    proposal_id TEXT,
-                    kml_file_url TEXT,
-                    kml_file_content TEXT,
-                    FOREIGN KEY(proposal_id) REFERENCES proposals(proposal_id)
-                )''')
-        
-        # Level 2b Table: proposal_forms (CAF, Part A, Part B, Part C)
-        c.execute('''CREATE TABLE IF NOT EXISTS proposal_forms (
-                    form_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    proposal_id TEXT,
-                    form_type TEXT,
-                    form_content TEXT,
-                    FOREIGN KEY(proposal_id) REFERENCES proposals(proposal_id)
-                )''')
-        
-        # Level 2b Table: documents (Uploaded documents)
-        c.execute('''CREATE TABLE IF NOT EXISTS documents (
-                    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    proposal_id TEXT,
-                    doc_name TEXT,
-                    doc_url TEXT,
-                    FOREIGN KEY(proposal_id) REFERENCES proposals(proposal_id)
-                )''')
-        
-        conn.commit()
+        migrate(conn)
         self.close()
 
     def insert_proposal(self, proposal_data):
@@ -103,7 +50,7 @@ class Database:
         if not existing:
             # New proposal
             c.execute('''INSERT INTO proposals 
-                        (proposal_id, s_w_no, state, year, proposal_title, current_status, last_updated) 
+                        (proposal_id, sw_no, state, year, project_name, current_status, last_updated) 
                         VALUES (?, ?, ?, ?, ?, ?, ?)''',
                      (proposal_data['proposal_id'], 
                       proposal_data.get('s_w_no', ''),
@@ -124,87 +71,73 @@ class Database:
             
             # Add to timeline
             if proposal_data.get('current_status'):
-                c.execute('''INSERT INTO proposal_timelines 
-                            (proposal_id, date, status) 
-                            VALUES (?, ?, ?)''',
+                c.execute(LEVEL2_UPSERTS['proposal_timelines'],
                          (proposal_data['proposal_id'],
+                          proposal_data.get('current_status', ''),
                           datetime.now(),
-                          proposal_data.get('current_status', '')))
+                          ''))
         
         conn.commit()
         self.close()
         return status_changed
 
     def insert_proposal_details(self, details_data):
-        """Insert or update proposal details."""
+        """Insert or update proposal details, kept as JSON in proposal_details.raw_json."""
         conn, c = self.connect()
         
-        c.execute('''INSERT OR REPLACE INTO proposal_details 
-                    (proposal_id, title, proponent, category, sector, proposal_for, date_submitted) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        # raw_json is compressed once the importer has trained a dictionary
+        codec = RawJsonCodec.load(conn)
+        c.execute(PROPOSAL_DETAILS_UPSERT,
                  (details_data['proposal_id'],
-                  details_data.get('title', ''),
-                  details_data.get('proponent', ''),
-                  details_data.get('category', ''),
-                  details_data.get('sector', ''),
-                  details_data.get('proposal_for', ''),
-                  details_data.get('date_submitted', None)))
+                  codec.encode(json.dumps(details_data, default=str))))
         
         conn.commit()
         self.close()
 
     def insert_timeline(self, timeline_data):
-        """Insert a timeline entry."""
+        """Insert a timeline entry, or update the remarks of the same status and date."""
         conn, c = self.connect()
         
-        c.execute('''INSERT INTO proposal_timelines 
-                    (proposal_id, date, status, remarks) 
-                    VALUES (?, ?, ?, ?)''',
+        c.execute(LEVEL2_UPSERTS['proposal_timelines'],
                  (timeline_data['proposal_id'],
-                  timeline_data.get('date', datetime.now()),
-                  timeline_data.get('status', ''),
+                  timeline_data.get('status') or '',
+                  timeline_data.get('date') or datetime.now(),
                   timeline_data.get('remarks', '')))
         
         conn.commit()
         self.close()
 
     def insert_project_location(self, location_data):
-        """Insert project location data."""
+        """Insert or replace project location data (the KML file content)."""
         conn, c = self.connect()
         
-        c.execute('''INSERT INTO project_locations 
-                    (proposal_id, kml_file_url, kml_file_content) 
-                    VALUES (?, ?, ?)''',
+        c.execute(LEVEL2_UPSERTS['project_locations'],
                  (location_data['proposal_id'],
-                  location_data.get('kml_file_url', ''),
                   location_data.get('kml_file_content', '')))
         
         conn.commit()
         self.close()
 
     def insert_form(self, form_data):
-        """Insert form data (CAF, Part A, B, C)."""
+        """Insert or update form data (CAF, Part A, B, C)."""
         conn, c = self.connect()
         
-        c.execute('''INSERT INTO proposal_forms 
-                    (proposal_id, form_type, form_content) 
-                    VALUES (?, ?, ?)''',
+        c.execute(LEVEL2_UPSERTS['proposal_forms'],
                  (form_data['proposal_id'],
-                  form_data.get('form_type', ''),
+                  form_data.get('form_type') or '',
                   form_data.get('form_content', '')))
         
         conn.commit()
         self.close()
 
     def insert_document(self, doc_data):
-        """Insert document data."""
+        """Insert or update document data."""
         conn, c = self.connect()
         
-        c.execute('''INSERT INTO documents 
-                    (proposal_id, doc_name, doc_url) 
-                    VALUES (?, ?, ?)''',
+        c.execute(LEVEL2_UPSERTS['documents'],
                  (doc_data['proposal_id'],
-                  doc_data.get('doc_name', ''),
+                  '',
+                  doc_data.get('doc_name') or '',
                   doc_data.get('doc_url', '')))
         
         conn.commit()
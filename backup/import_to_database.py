@@ -1,10 +1,16 @@
 import json
-import sqlite3
 import logging
 import os
+import sys
 import time
 import requests
-from datetime import datetime
+
+# The shared database modules live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import connect
+from db_schema import level2_rows, migrate, property_rows, write_level2_rows, write_properties
+from raw_json_codec import RawJsonCodec
+from record_mapper import PROPOSAL_DETAILS_UPSERT, PROPOSAL_UPSERT, proposal_record_rows
 
 # Set up logging
 logging.basicConfig(
@@ -15,96 +21,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def create_database_schema(db_path):
-    """Create the database schema if it doesn't exist."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create proposals table (Level 1)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT UNIQUE,
-        proposal_no TEXT,
-        project_name TEXT,
-        company_name TEXT,
-        state TEXT,
-        category TEXT,
-        sector TEXT,
-        proposal_status TEXT,
-        proposal_type TEXT,
-        clearance_type TEXT,
-        sw_no TEXT,
-        last_submission_date TEXT,
-        last_status_date TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create proposal_details table (Level 2a)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_details (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT UNIQUE,
-        proposal_json TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create proposal_timelines table (Level 2a)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_timelines (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        status TEXT,
-        date TEXT,
-        remarks TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create project_locations table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS project_locations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        location_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create proposal_forms table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_forms (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        form_type TEXT,
-        form_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create documents table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        document_type TEXT,
-        document_name TEXT,
-        document_url TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    conn.commit()
+    """Bring the database up to the current schema, migrating an older one in place."""
+    conn = connect(db_path)
+    migrate(conn)
     conn.close()
-    logger.info("Database schema created successfully")
+    logger.info("Database schema is up to date")
 
 def process_proposal(proposal, cursor, session, headers):
     """Process a single proposal and insert into database."""
@@ -113,96 +34,14 @@ def process_proposal(proposal, cursor, session, headers):
         logger.warning("Proposal ID not found in proposal data")
         return False
     
-    # Check if proposal already exists
-    cursor.execute("SELECT id FROM proposals WHERE proposal_id = ?", (proposal_id,))
-    result = cursor.fetchone()
-    if result:
-        logger.info(f"Proposal {proposal_id} already exists in database, updating...")
-        # Update existing proposal
-        cursor.execute('''
-        UPDATE proposals SET
-            proposal_no = ?,
-            project_name = ?,
-            company_name = ?,
-            state = ?,
-            category = ?,
-            sector = ?,
-            proposal_status = ?,
-            proposal_type = ?,
-            clearance_type = ?,
-            sw_no = ?,
-            last_submission_date = ?,
-            last_status_date = ?,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE proposal_id = ?
-        ''', (
-            proposal.get('proposalNo', ''),
-            proposal.get('projectName', ''),
-            proposal.get('companyName', ''),
-            proposal.get('stateName', ''),
-            proposal.get('categoryName', ''),
-            proposal.get('sectorName', ''),
-            proposal.get('proposalStatus', ''),
-            proposal.get('proposalType', ''),
-            proposal.get('clearanceTypeName', ''),
-            proposal.get('swNo', ''),
-            proposal.get('lastSubmissionDate', ''),
-            proposal.get('lastStatusDate', ''),
-            proposal_id
-        ))
-    else:
-        # Insert new proposal
-        cursor.execute('''
-        INSERT INTO proposals (
-            proposal_id,
-            proposal_no,
-            project_name,
-            company_name,
-            state,
-            category,
-            sector,
-            proposal_status,
-            proposal_type,
-            clearance_type,
-            sw_no,
-            last_submission_date,
-            last_status_date
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            proposal_id,
-            proposal.get('proposalNo', ''),
-            proposal.get('projectName', ''),
-            proposal.get('companyName', ''),
-            proposal.get('stateName', ''),
-            proposal.get('categoryName', ''),
-            proposal.get('sectorName', ''),
-            proposal.get('proposalStatus', ''),
-            proposal.get('proposalType', ''),
-            proposal.get('clearanceTypeName', ''),
-            proposal.get('swNo', ''),
-            proposal.get('lastSubmissionDate', ''),
-            proposal.get('lastStatusDate', '')
-        ))
-    
-    # Store proposal details (Level 2a)
-    cursor.execute("SELECT id FROM proposal_details WHERE proposal_id = ?", (proposal_id,))
-    result = cursor.fetchone()
-    if result:
-        # Update existing details
-        cursor.execute('''
-        UPDATE proposal_details SET
-            proposal_json = ?,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE proposal_id = ?
-        ''', (json.dumps(proposal), proposal_id))
-    else:
-        # Insert new details
-        cursor.execute('''
-        INSERT INTO proposal_details (
-            proposal_id,
-            proposal_json
-        ) VALUES (?, ?)
-        ''', (proposal_id, json.dumps(proposal)))
+    # Store the proposal (Level 1) and its details (Level 2a) with the
+    # importers' shared mapping; raw_json is compressed once the importer
+    # has trained a dictionary
+    codec = RawJsonCodec.load(cursor.connection)
+    proposal_row, details_row = proposal_record_rows(proposal, codec)
+    cursor.execute(PROPOSAL_UPSERT, proposal_row)
+    cursor.execute(PROPOSAL_DETAILS_UPSERT, details_row)
+    write_properties(cursor, [proposal_id], property_rows(proposal_id, proposal))
     
     # Get and process additional data (Level 2a and 2b)
     get_and_process_additional_data(cursor, proposal_id, session, headers)
@@ -210,99 +49,25 @@ def process_proposal(proposal, cursor, session, headers):
     return True
 
 def get_and_process_additional_data(cursor, proposal_id, session, headers):
-    """Get and process additional data for a proposal."""
+    """Get and process additional data for a proposal.
+    
+    Rows are upserted by their natural keys, so importing a proposal
+    again adds no duplicates.
+    """
     # API base URL
     base_url = "https://parivesh.nic.in/parivesh_api/trackYourProposal"
     
-    # Get proposal timelines (Level 2a)
-    try:
-        timelines = get_proposal_timelines(proposal_id, session, headers, base_url)
-        if timelines:
-            # Delete existing timelines
-            cursor.execute("DELETE FROM proposal_timelines WHERE proposal_id = ?", (proposal_id,))
-            
-            # Insert new timelines
-            for timeline in timelines:
-                cursor.execute('''
-                INSERT INTO proposal_timelines (
-                    proposal_id,
-                    status,
-                    date,
-                    remarks
-                ) VALUES (?, ?, ?, ?)
-                ''', (
-                    proposal_id,
-                    timeline.get('status', ''),
-                    timeline.get('date', ''),
-                    timeline.get('remarks', '')
-                ))
-            logger.info(f"Inserted {len(timelines)} timelines for proposal {proposal_id}")
-    except Exception as e:
-        logger.error(f"Error getting timelines for proposal {proposal_id}: {str(e)}")
-    
-    # Get project location (Level 2b)
-    try:
-        location = get_project_location(proposal_id, session, headers, base_url)
-        if location:
-            # Delete existing location
-            cursor.execute("DELETE FROM project_locations WHERE proposal_id = ?", (proposal_id,))
-            
-            # Insert new location
-            cursor.execute('''
-            INSERT INTO project_locations (
-                proposal_id,
-                location_data
-            ) VALUES (?, ?)
-            ''', (proposal_id, json.dumps(location) if isinstance(location, dict) else location))
-            logger.info(f"Inserted location data for proposal {proposal_id}")
-    except Exception as e:
-        logger.error(f"Error getting location for proposal {proposal_id}: {str(e)}")
-    
-    # Get proposal forms (Level 2b)
-    try:
-        forms = get_proposal_forms(proposal_id, session, headers, base_url)
-        if forms:
-            # Delete existing forms
-            cursor.execute("DELETE FROM proposal_forms WHERE proposal_id = ?", (proposal_id,))
-            
-            # Insert new forms
-            for form_type, form_data in forms.items():
-                cursor.execute('''
-                INSERT INTO proposal_forms (
-                    proposal_id,
-                    form_type,
-                    form_data
-                ) VALUES (?, ?, ?)
-                ''', (proposal_id, form_type, json.dumps(form_data)))
-            logger.info(f"Inserted {len(forms)} forms for proposal {proposal_id}")
-    except Exception as e:
-        logger.error(f"Error getting forms for proposal {proposal_id}: {str(e)}")
-    
-    # Get documents (Level 2b)
-    try:
-        documents = get_documents(proposal_id, session, headers, base_url)
-        if documents:
-            # Delete existing documents
-            cursor.execute("DELETE FROM documents WHERE proposal_id = ?", (proposal_id,))
-            
-            # Insert new documents
-            for document in documents:
-                cursor.execute('''
-                INSERT INTO documents (
-                    proposal_id,
-                    document_type,
-                    document_name,
-                    document_url
-                ) VALUES (?, ?, ?, ?)
-                ''', (
-                    proposal_id,
-                    document.get('documentType', ''),
-                    document.get('documentName', ''),
-                    document.get('documentUrl', '')
-                ))
-            logger.info(f"Inserted {len(documents)} documents for proposal {proposal_id}")
-    except Exception as e:
-        logger.error(f"Error getting documents for proposal {proposal_id}: {str(e)}")
+    level2 = {
+        'timelines': get_proposal_timelines(proposal_id, session, headers, base_url),
+        'location': get_project_location(proposal_id, session, headers, base_url),
+        'forms': get_proposal_forms(proposal_id, session, headers, base_url),
+        'documents': get_documents(proposal_id, session, headers, base_url)
+    }
+    rows = level2_rows(proposal_id, level2)
+    write_level2_rows(cursor, rows)
+    for table, table_rows in rows.items():
+        if table_rows:
+            logger.info(f"Inserted {len(table_rows)} {table} rows for proposal {proposal_id}")
 
 def get_proposal_timelines(proposal_id, session, headers, base_url):
     """Get timeline information for a proposal."""
@@ -463,7 +228,7 @@ def import_to_database(json_file, db_path):
     create_database_schema(db_path)
     
     # Create a database connection
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
     
     # Create a session for API requests
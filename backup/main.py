@@ -2,15 +2,21 @@ import argparse
 import logging
 from datetime import datetime
 import os
+import sys
 
 from scraper import PariveshScraper
 
+# The shared crawl modules live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crawl_planner import CRAWLED, PROCESSED, CrawlCheckpoint, plan_shards, run_shards
+from ndjson_stream import read_records
+
 def main():
     """Main function to run the scraper."""
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Parivesh Proposal Scraper')
-    parser.add_argument('--state', default='TELANGANA', 
-                        help='State to scrape (default: TELANGANA)')
+    parser.add_argument('--state', nargs='+', default=['TELANGANA'], 
+                        help='States to scrape, or ALL for every active state (default: TELANGANA)')
     parser.add_argument('--years', nargs='+', type=int, 
                         help='Years to scrape (default: last 5 years)')
     parser.add_argument('--db-path', default='parivesh_data.db', 
@@ -22,6 +28,14 @@ def main():
                         help='Interval in hours to check for new proposals (default: 24)')
     parser.add_argument('--all-clearance-types', action='store_true',
                         help='Search across all clearance types (default: False)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of shards crawled in parallel (default: 4)')
+    parser.add_argument('--checkpoint', default='crawl_checkpoint.json',
+                        help='File recording crawl progress, used to resume (default: crawl_checkpoint.json)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted crawl, skipping shards the checkpoint has as done (default: start afresh)')
+    parser.add_argument('--output-dir', default='shards',
+                        help='Directory the proposals of each shard are written to (default: shards)')
     
     args = parser.parse_args()
     
@@ -47,7 +61,7 @@ def main():
     logger.addHandler(console)
     
     logger.info("Starting Parivesh Proposal Scraper")
-    logger.info(f"State: {args.state}")
+    logger.info(f"States: {args.state}")
     logger.info(f"Years: {args.years}")
     logger.info(f"Database path: {args.db_path}")
     logger.info(f"All clearance types: {args.all_clearance_types}")
@@ -55,17 +69,16 @@ def main():
     # Initialize scraper
     scraper = PariveshScraper(args.db_path)
     
-    # Get the state ID for the specified state
+    # Get the IDs of the requested states
     states = scraper.get_states()
-    state_id = None
-    for state in states:
-        if state['name'] == args.state:
-            state_id = state['id']
-            break
-    
-    if not state_id:
-        logger.error(f"State '{args.state}' not found. Available states: {[s['name'] for s in states]}")
-        return
+    if [name.upper() for name in args.state] == ['ALL']:
+        selected_states = states
+    else:
+        selected_states = [state for state in states if state['name'] in args.state]
+        missing = set(args.state) - {state['name'] for state in selected_states}
+        if missing:
+            logger.error(f"States {sorted(missing)} not found. Available states: {[s['name'] for s in states]}")
+            return
     
     # Get clearance types
     clearance_types = [1]  # Default to Environmental Clearance (EC)
@@ -76,25 +89,42 @@ def main():
             clearance_types = [ct['id'] for ct in clearance_types_data]
             logger.info(f"Using all clearance types: {clearance_types}")
     
-    # Run scraper for each year and clearance type
+    # Split the crawl into one shard per state, year and clearance type
+    shards = plan_shards(selected_states, args.years, clearance_types)
+    logger.info(f"Planned {len(shards)} shards")
+    
+    # Crawl the shards in parallel; finished shards are checkpointed
+    checkpoint = CrawlCheckpoint(args.checkpoint)
+    if args.resume:
+        logger.info(f"Resuming the crawl recorded in {args.checkpoint}")
+    else:
+        checkpoint.reset()
+    scraper.run(run_shards(
+        scraper.client,
+        shards,
+        workers=args.workers,
+        checkpoint=checkpoint,
+        output_dir=args.output_dir
+    ))
+    
+    # Process each crawled shard
     total_proposals = 0
-    for year in args.years:
-        for clearance_type in clearance_types:
-            logger.info(f"Scraping proposals for {args.state} in {year} with clearance type {clearance_type}")
-            proposals = scraper.search_proposals(state_id, year, major_clearance_type=clearance_type)
-            
-            if proposals:
-                logger.info(f"Found {len(proposals)} proposals for {args.state} in {year} with clearance type {clearance_type}")
-                
-                # Process each proposal
-                for proposal in proposals:
-                    result = scraper.process_proposal(proposal)
-                    if result:
-                        total_proposals += 1
-            else:
-                logger.info(f"No proposals found for {args.state} in {year} with clearance type {clearance_type}")
+    for shard in shards:
+        if checkpoint.status(shard) != CRAWLED:
+            continue
+        
+        logger.info(f"Processing {checkpoint.get(shard).get('proposals', 0)} proposals for {shard}")
+        processed = 0
+        for proposal in read_records(checkpoint.get(shard)['file']):
+            result = scraper.process_proposal(proposal)
+            if result:
+                processed += 1
+        
+        checkpoint.mark(shard, PROCESSED, processed=processed)
+        total_proposals += processed
     
     logger.info(f"Scraping completed successfully. Processed {total_proposals} proposals.")
+    scraper.close()
 
 if __name__ == "__main__":
     main()
@@ -2,8 +2,14 @@ import json
 import sqlite3
 import logging
 import os
-import time
-from datetime import datetime
+import sys
+
+# The shared database helpers live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import connect, connect_readonly
+from db_schema import migrate, property_rows, write_properties
+from raw_json_codec import TRAIN_SAMPLES, RawJsonCodec
+from record_mapper import PROPOSAL_DETAILS_UPSERT, PROPOSAL_UPSERT, proposal_record_rows
 
 # Set up logging
 logging.basicConfig(
@@ -13,97 +19,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def create_tables(conn):
-    """Create the necessary tables if they don't exist."""
-    cursor = conn.cursor()
-    
-    # Create proposals table (Level 1)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposalNo TEXT UNIQUE,
-        projectName TEXT,
-        companyName TEXT,
-        stateName TEXT,
-        categoryName TEXT,
-        sectorName TEXT,
-        proposalStatus TEXT,
-        proposalType TEXT,
-        clearanceTypeName TEXT,
-        swNo TEXT,
-        lastSubmissionDate TEXT,
-        lastStatusDate TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create proposal_details table (Level 2a)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_details (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposalNo TEXT UNIQUE,
-        proposal_json TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposalNo) REFERENCES proposals (proposalNo)
-    )
-    ''')
-    
-    # Create proposal_timelines table (Level 2a)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_timelines (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposalNo TEXT,
-        status TEXT,
-        date TEXT,
-        remarks TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposalNo) REFERENCES proposals (proposalNo)
-    )
-    ''')
-    
-    # Create project_locations table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS project_locations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposalNo TEXT,
-        location_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposalNo) REFERENCES proposals (proposalNo)
-    )
-    ''')
-    
-    # Create proposal_forms table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_forms (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposalNo TEXT,
-        form_type TEXT,
-        form_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposalNo) REFERENCES proposals (proposalNo)
-    )
-    ''')
-    
-    # Create documents table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposalNo TEXT,
-        document_type TEXT,
-        document_name TEXT,
-        document_url TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposalNo) REFERENCES proposals (proposalNo)
-    )
-    ''')
-    
-    conn.commit()
-    logger.info("Database tables created successfully")
-
 def process_proposals(json_file, db_path):
-    """Process proposals from JSON file and store in database."""
+    """Process proposals from JSON file and store in database.
+    
+    Rows are built with the importers' shared record mapping and written
+    with one executemany per table in a single transaction.
+    """
     if not os.path.exists(json_file):
         logger.error(f"JSON file {json_file} not found")
         return False
@@ -115,130 +36,37 @@ def process_proposals(json_file, db_path):
         
         logger.info(f"Loaded {len(proposals)} proposals from {json_file}")
         
-        # Connect to database
-        conn = sqlite3.connect(db_path)
+        # Connect to database and bring it up to the current schema
+        conn = connect(db_path)
+        migrate(conn)
         
-        # Create tables if they don't exist
-        create_tables(conn)
-        
-        # Process each proposal
-        cursor = conn.cursor()
-        processed_count = 0
+        codec = RawJsonCodec.load(conn)
+        if codec.dictionary is None:
+            RawJsonCodec.create_table(conn)
+            codec.train(proposals[:TRAIN_SAMPLES])
         
+        proposal_rows = []
+        details_rows = []
+        properties = []
         for i, proposal in enumerate(proposals):
-            try:
-                proposal_no = proposal.get('proposalNo')
-                if not proposal_no:
-                    logger.warning(f"Proposal at index {i} has no proposalNo, skipping")
-                    continue
-                
-                logger.info(f"Processing proposal {i+1}/{len(proposals)}: {proposal_no}")
-                
-                # Check if proposal already exists
-                cursor.execute("SELECT id FROM proposals WHERE proposalNo = ?", (proposal_no,))
-                result = cursor.fetchone()
-                
-                if result:
-                    # Update existing proposal
-                    cursor.execute('''
-                    UPDATE proposals SET
-                        projectName = ?,
-                        companyName = ?,
-                        stateName = ?,
-                        categoryName = ?,
-                        sectorName = ?,
-                        proposalStatus = ?,
-                        proposalType = ?,
-                        clearanceTypeName = ?,
-                        swNo = ?,
-                        lastSubmissionDate = ?,
-                        lastStatusDate = ?,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE proposalNo = ?
-                    ''', (
-                        proposal.get('projectName', ''),
-                        proposal.get('companyName', ''),
-                        proposal.get('stateName', ''),
-                        proposal.get('categoryName', ''),
-                        proposal.get('sectorName', ''),
-                        proposal.get('proposalStatus', ''),
-                        proposal.get('proposalType', ''),
-                        proposal.get('clearanceTypeName', ''),
-                        proposal.get('swNo', ''),
-                        proposal.get('lastSubmissionDate', ''),
-                        proposal.get('lastStatusDate', ''),
-                        proposal_no
-                    ))
-                else:
-                    # Insert new proposal
-                    cursor.execute('''
-                    INSERT INTO proposals (
-                        proposalNo,
-                        projectName,
-                        companyName,
-                        stateName,
-                        categoryName,
-                        sectorName,
-                        proposalStatus,
-                        proposalType,
-                        clearanceTypeName,
-                        swNo,
-                        lastSubmissionDate,
-                        lastStatusDate
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        proposal_no,
-                        proposal.get('projectName', ''),
-                        proposal.get('companyName', ''),
-                        proposal.get('stateName', ''),
-                        proposal.get('categoryName', ''),
-                        proposal.get('sectorName', ''),
-                        proposal.get('proposalStatus', ''),
-                        proposal.get('proposalType', ''),
-                        proposal.get('clearanceTypeName', ''),
-                        proposal.get('swNo', ''),
-                        proposal.get('lastSubmissionDate', ''),
-                        proposal.get('lastStatusDate', '')
-                    ))
-                
-                # Store proposal details (Level 2a)
-                cursor.execute("SELECT id FROM proposal_details WHERE proposalNo = ?", (proposal_no,))
-                result = cursor.fetchone()
-                
-                if result:
-                    # Update existing details
-                    cursor.execute('''
-                    UPDATE proposal_details SET
-                        proposal_json = ?,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE proposalNo = ?
-                    ''', (json.dumps(proposal), proposal_no))
-                else:
-                    # Insert new details
-                    cursor.execute('''
-                    INSERT INTO proposal_details (
-                        proposalNo,
-                        proposal_json
-                    ) VALUES (?, ?)
-                    ''', (proposal_no, json.dumps(proposal)))
-                
-                processed_count += 1
-                
-                # Commit every 10 proposals
-                if processed_count % 10 == 0:
-                    conn.commit()
-                    logger.info(f"Committed {processed_count} proposals to database")
-            
-            except Exception as e:
-                logger.error(f"Error processing proposal {proposal.get('proposalNo', 'Unknown')}: {str(e)}")
+            if not proposal.get('proposalNo'):
+                logger.warning(f"Proposal at index {i} has no proposalNo, skipping")
+                continue
+            proposal_row, details_row = proposal_record_rows(proposal, codec)
+            proposal_rows.append(proposal_row)
+            details_rows.append(details_row)
+            properties.extend(property_rows(proposal_row[0], proposal))
         
-        # Final commit
+        cursor = conn.cursor()
+        cursor.executemany(PROPOSAL_UPSERT, proposal_rows)
+        cursor.executemany(PROPOSAL_DETAILS_UPSERT, details_rows)
+        write_properties(cursor, [row[0] for row in proposal_rows], properties)
         conn.commit()
         
         # Close database connection
         conn.close()
         
-        logger.info(f"Processed {processed_count} out of {len(proposals)} proposals")
+        logger.info(f"Processed {len(proposal_rows)} out of {len(proposals)} proposals")
         return True
     
     except Exception as e:
@@ -254,7 +82,7 @@ def check_database(db_path):
         return
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         # Get table counts
@@ -282,7 +110,7 @@ def check_database(db_path):
         
         # Get proposal status counts if the column exists
         status_column = None
-        for possible_column in ['proposalStatus', 'proposal_status', 'status']:
+        for possible_column in ['current_status', 'proposalStatus', 'proposal_status', 'status']:
             if possible_column in columns:
                 status_column = possible_column
                 break
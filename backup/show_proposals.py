@@ -1,14 +1,18 @@
-import sqlite3
 import os
+import sys
 from tabulate import tabulate
 
+# The shared database modules live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import connect_readonly
+
 def show_proposals(db_path):
     """Show the proposals table in a nicely formatted way."""
     if not os.path.exists(db_path):
         print(f"Database file not found: {db_path}")
         return
     
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     cursor = conn.cursor()
     
     # Get column names for proposals table
@@ -1,6 +1,4 @@
 import os
-import time
-import random
 import logging
 from datetime import datetime
 
@@ -28,12 +26,6 @@ def setup_headers():
         "Cache-Control": "max-age=0"
     }
 
-def random_delay(min_seconds=1, max_seconds=3):
-    """Add a random delay between requests to avoid rate limiting."""
-    delay = random.uniform(min_seconds, max_seconds)
-    time.sleep(delay)
-    return delay
-
 def parse_date(date_str):
     """Parse date string into datetime object."""
     try:
@@ -1,8 +1,7 @@
-import sqlite3
 import sys
 import os
-import json
-from datetime import datetime
+
+from db import connect_readonly
 
 def check_database(db_path):
     """Check the database and print statistics about the proposals."""
@@ -11,7 +10,7 @@ def check_database(db_path):
         return
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         # List all tables in the database
@@ -50,6 +49,18 @@ def check_database(db_path):
             for status, count in proposals_by_status:
                 print(f"  {status}: {count}")
         
+        # Get proposals by activity and by what they are for
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='proposal_properties'")
+        if cursor.fetchone():
+            for label in ("Activity", "Proposal For"):
+                cursor.execute(
+                    "SELECT value, COUNT(*) FROM proposal_properties WHERE label = ? GROUP BY value ORDER BY COUNT(*) DESC",
+                    (label,)
+                )
+                print(f"\nProposals by {label.lower()}:")
+                for value, count in cursor.fetchall():
+                    print(f"  {value}: {count}")
+        
         # Check Level 2a data
         cursor.execute("SELECT COUNT(*) FROM proposal_details")
         details_count = cursor.fetchone()[0]
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from crawler import stream_proposals
+from ndjson_stream import NDJSONWriter
+
+logger = logging.getLogger(__name__)
+
+# File the shard checkpoints are kept in between runs
+DEFAULT_CHECKPOINT_FILE = "crawl_checkpoint.json"
+
+# Directory each shard's proposals are streamed into
+DEFAULT_OUTPUT_DIR = "shards"
+
+# Number of shards crawled at the same time
+SHARD_WORKERS = 4
+
+# Shard states, in the order a shard goes through them
+PENDING = "pending"
+CRAWLED = "crawled"
+PROCESSED = "processed"
+FAILED = "failed"
+
+
+class Shard(namedtuple("Shard", ["state_id", "state_name", "year", "clearance_type"])):
+    """One advanceSearchData search: a state, a year and a clearance type."""
+
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return f"state_{self.state_id}_{self.year}_type_{self.clearance_type}"
+
+    def __str__(self):
+        return f"{self.state_name or self.state_id} {self.year} (clearance type {self.clearance_type})"
+
+
+def plan_shards(states, years, clearance_types):
+    """Expand states x years x clearance types into a list of shards.
+
+    states is a list of {'id': ..., 'name': ...} dicts, as returned by
+    PariveshScraper.get_states(); clearance_types a list of IDs.
+    """
+    return [
+        Shard(state['id'], state.get('name'), year, clearance_type)
+        for state in states
+        for year in years
+        for clearance_type in clearance_types
+    ]
+
+
+class CrawlCheckpoint:
+    """Remembers how far each shard of a crawl got, so a crawl can resume.
+
+    Kept as a small JSON file mapping each shard key to its state, its
+    output file and how many proposals it had.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_FILE):
+        self.path = path
+        self.shards = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.shards = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read crawl checkpoint {path}: {str(e)}")
+
+    def reset(self):
+        """Forget every shard, so the next crawl starts from scratch."""
+        self.shards = {}
+        self.save()
+
+    def save(self):
+        """Write the checkpoint file."""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.shards, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def status(self, shard):
+        return self.shards.get(shard.key, {}).get("status", PENDING)
+
+    def get(self, shard):
+        return self.shards.get(shard.key, {})
+
+    def mark(self, shard, status, **info):
+        """Record a shard's new state and save the checkpoint."""
+        entry = self.shards.setdefault(shard.key, {})
+        entry.update(info, status=status, updated=datetime.now().isoformat(timespec='seconds'))
+        self.save()
+
+
+async def crawl_shard(client, shard, output_dir, archive=None, page_size=None):
+    """Stream every proposal of a shard into its own NDJSON file and return the count and path."""
+    path = os.path.join(output_dir, f"{shard.key}.ndjson")
+    # Pages are written and fsynced by the writer's thread, off the event loop
+    with NDJSONWriter(path, background=True) as writer:
+        total = await stream_proposals(
+            client,
+            shard.state_id,
+            shard.year,
+            lambda page, proposals: writer.write_page(proposals),
+            major_clearance_type=shard.clearance_type,
+            page_size=page_size,
+            archive=archive
+        )
+    return total, path
+
+
+async def run_shards(client, shards, workers=SHARD_WORKERS, checkpoint=None, output_dir=DEFAULT_OUTPUT_DIR,
+                     archive=None, page_size=None):
+    """Crawl shards from a work queue with parallel workers.
+
+    Shards the checkpoint already has as crawled or processed are skipped;
+    reset the checkpoint first unless an interrupted crawl is being resumed.
+    Each finished shard is checkpointed straight away and progress is
+    logged with an estimate of the time left. Returns the shards crawled
+    in this run mapped to their proposal counts.
+    """
+    checkpoint = checkpoint or CrawlCheckpoint(None)
+    os.makedirs(output_dir, exist_ok=True)
+
+    todo = [
+        shard for shard in shards
+        if checkpoint.status(shard) not in (CRAWLED, PROCESSED) or not os.path.exists(checkpoint.get(shard).get("file", ""))
+    ]
+    skipped = len(shards) - len(todo)
+    if skipped:
+        logger.info(f"Skipping {skipped} shards already crawled")
+    logger.info(f"Crawling {len(todo)} shards with {workers} workers")
+
+    queue = asyncio.Queue()
+    for shard in todo:
+        queue.put_nowait(shard)
+
+    results = {}
+    started = time.monotonic()
+    finished = 0
+
+    async def worker():
+        nonlocal finished
+        while True:
+            try:
+                shard = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            try:
+                total, path = await crawl_shard(client, shard, output_dir, archive, page_size)
+                checkpoint.mark(shard, CRAWLED, proposals=total, file=path)
+                results[shard] = total
+            except Exception as e:
+                logger.error(f"Error crawling shard {shard}: {str(e)}")
+                checkpoint.mark(shard, FAILED, error=str(e))
+
+            finished += 1
+            elapsed = time.monotonic() - started
+            remaining = elapsed / finished * (len(todo) - finished)
+            logger.info(
+                f"[{finished}/{len(todo)}] {shard}: {results.get(shard, 0)} proposals, "
+                f"{sum(results.values())} in total, about {remaining:.0f}s left"
+            )
+
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(todo)))))
+
+    failed = len(todo) - len(results)
+    logger.info(f"Crawled {len(results)} shards with {sum(results.values())} proposals, {failed} failed")
+    return results
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import math
+
+import aiohttp
+
+from retry_policy import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Number of pages fetched at the same time once the result size is known
+MAX_WORKERS = 8
+
+# How many times a page that failed, or came back short, is fetched again
+MAX_PAGE_RETRIES = 3
+
+# Envelope keys that may carry the size of the whole result set; generic
+# keys such as "count" often hold the size of the current page instead
+TOTAL_KEYS = ("totalElements", "totalRecords", "totalRecord", "totalCount")
+PAGE_COUNT_KEYS = ("totalPages", "totalPage", "pageCount")
+
+
+class IncompleteCrawlError(Exception):
+    """Raised when a crawl ends without some of its pages.
+
+    Pages that did arrive have already been handed over; proposals is how
+    many proposals they held.
+    """
+
+    def __init__(self, missing, proposals):
+        super().__init__(f"Pages {missing} could not be retrieved")
+        self.missing = missing
+        self.proposals = proposals
+
+def page_records(envelope):
+    """Return the list of proposals in an advanceSearchData envelope, or None."""
+    if isinstance(envelope, dict) and 'data' in envelope and isinstance(envelope['data'], list):
+        return envelope['data']
+    return None
+
+def result_size(envelope, page_size):
+    """Work out how many pages the result set has from the envelope metadata.
+    
+    Looks at the envelope itself and at any nested page/meta dict. Returns
+    None when the server sent no usable total.
+    """
+    candidates = [envelope] + [value for value in envelope.values() if isinstance(value, dict)]
+    
+    for candidate in candidates:
+        for key in TOTAL_KEYS:
+            total = candidate.get(key)
+            if isinstance(total, int) and not isinstance(total, bool) and total >= 0:
+                return math.ceil(total / page_size)
+        for key in PAGE_COUNT_KEYS:
+            pages = candidate.get(key)
+            if isinstance(pages, int) and not isinstance(pages, bool) and pages >= 0:
+                return pages
+    
+    return None
+
+def archive_name(search):
+    """Name the archived pages of a search are stored under."""
+    return f"state_{search['state']}_{search['year']}_type_{search['major_clearance_type']}"
+
+async def fetch_page(client, search, page, page_size, archive=None):
+    """Fetch a single advanceSearchData page, returning its envelope or None.
+    
+    Transient failures are already retried by the client. The raw page is
+    added to the archive when one is given.
+    """
+    try:
+        data = await client.advance_search_data(page=page, size=page_size, **search)
+    except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+        logger.error(f"Failed to retrieve page {page}: {type(e).__name__}: {str(e)}")
+        return None
+    
+    # Keep the raw response for replay and debugging; compressing and
+    # writing it is left to a thread so the event loop keeps fetching
+    if archive is not None:
+        await asyncio.to_thread(archive.save_page, archive_name(search), page, data, dict(search, page=page, size=page_size))
+    
+    if page_records(data) is not None:
+        return data
+    
+    logger.warning(f"Unexpected response format for page {page}")
+    return None
+
+async def fetch_first_page(client, search, page_size, archive, probe_pages):
+    """Return the envelope of page 0, reusing the one the page size probe fetched at this size."""
+    envelope = probe_pages.get((page_size, 0))
+    if page_records(envelope) is None:
+        return await fetch_page(client, search, 0, page_size, archive)
+    
+    if archive is not None:
+        await asyncio.to_thread(archive.save_page, archive_name(search), 0, envelope, dict(search, page=0, size=page_size))
+    return envelope
+
+async def fetch_pages(client, search, pages, page_size, last_page, archive, on_page):
+    """Fetch the given pages concurrently, handing each to on_page(page, proposals) once final.
+    
+    Every page except the last one must come back full. Pages that fail or come
+    back short are fetched again, up to MAX_PAGE_RETRIES rounds; a page that is
+    still short after that is handed over as it is. Returns the pages that
+    could not be retrieved at all.
+    """
+    done = set()
+    short_pages = {}
+    pending = list(pages)
+    attempt = 0
+    workers = asyncio.Semaphore(MAX_WORKERS)
+    
+    async def fetch(page):
+        async with workers:
+            return page, page_records(await fetch_page(client, search, page, page_size, archive))
+    
+    while pending and attempt <= MAX_PAGE_RETRIES:
+        if attempt > 0:
+            delay = client.retry_policy.delay(attempt)
+            logger.info(f"Retrying {len(pending)} missing or short pages in {delay:.1f}s: {pending}")
+            await asyncio.sleep(delay)
+        
+        for coro in asyncio.as_completed([fetch(page) for page in pending]):
+            page, proposals = await coro
+            if proposals is None:
+                continue
+            
+            logger.info(f"Retrieved {len(proposals)} proposals from page {page}")
+            if len(proposals) < page_size and page != last_page:
+                logger.warning(f"Page {page} returned {len(proposals)} of {page_size} proposals")
+                # Keep the short page in case retries don't do any better
+                if len(proposals) > len(short_pages.get(page, [])):
+                    short_pages[page] = proposals
+                continue
+            
+            short_pages.pop(page, None)
+            done.add(page)
+            on_page(page, proposals)
+        
+        pending = [page for page in pages if page not in done]
+        attempt += 1
+    
+    if pending:
+        logger.error(f"Pages still missing or short after {MAX_PAGE_RETRIES} retries: {pending}")
+    
+    for page in sorted(short_pages):
+        on_page(page, short_pages[page])
+    return [page for page in pending if page not in short_pages]
+
+async def fetch_until_short_page(client, search, page_size, archive, on_page):
+    """Fetch pages from page 1 on, a window at a time, until one comes back short.
+    
+    Used when the server gives no result size; a short or empty page means the end.
+    Returns the page that could not be retrieved, if the crawl stopped at one.
+    """
+    workers = asyncio.Semaphore(MAX_WORKERS)
+    
+    async def fetch(page):
+        async with workers:
+            return page, page_records(await fetch_page(client, search, page, page_size, archive))
+    
+    next_page = 1
+    while True:
+        window = range(next_page, next_page + MAX_WORKERS)
+        for page, proposals in await asyncio.gather(*(fetch(page) for page in window)):
+            if proposals is None:
+                logger.error(f"Stopping at page {page}, it could not be retrieved")
+                return page
+            
+            logger.info(f"Retrieved {len(proposals)} proposals from page {page}")
+            if proposals:
+                on_page(page, proposals)
+            if len(proposals) < page_size:
+                logger.info(f"Reached end of results on page {page}")
+                return None
+        next_page += MAX_WORKERS
+
+async def stream_proposals(client, state_id, year, on_page, major_clearance_type=1, page_size=None, archive=None):
+    """Crawl every advanceSearchData page for a state and year, handing pages to on_page as they arrive.
+    
+    Page 0 is fetched on its own; its envelope tells us how many pages there
+    are, and the rest are then fetched concurrently. Without that metadata the
+    crawl falls back to stopping at the first short page. With no page_size
+    the client's learned page size is used. Raw pages are kept in the
+    given PageArchive, if any.
+    
+    on_page(page, proposals) is called once per page, in page order. A page
+    that completes before the ones ahead of it is held until they arrive,
+    so normally no more than the pages in flight are held. Returns the
+    number of proposals handed over. Raises IncompleteCrawlError if page 0,
+    or any page still missing after the retries, could not be retrieved;
+    the pages after a missing one are handed over first.
+    """
+    search = {
+        "major_clearance_type": major_clearance_type,
+        "state": state_id,
+        "year": year
+    }
+    total = 0
+    held = {}
+    next_page = 0
+    
+    def hand_over(page, proposals):
+        nonlocal total
+        total += len(proposals)
+        on_page(page, proposals)
+    
+    def accept(page, proposals):
+        nonlocal next_page
+        held[page] = proposals
+        while next_page in held:
+            hand_over(next_page, held.pop(next_page))
+            next_page += 1
+    
+    def incomplete(missing):
+        # Hand over what arrived behind the missing pages before giving up
+        for page in sorted(held):
+            hand_over(page, held.pop(page))
+        return IncompleteCrawlError(missing, total)
+    
+    tuned = page_size is None
+    probe_pages = {}
+    if tuned:
+        page_size = await client.tune_page_size(
+            state_id, year, workers=MAX_WORKERS, major_clearance_type=major_clearance_type, probe_pages=probe_pages
+        )
+        logger.info(f"Using page size {page_size}")
+    
+    logger.info(f"Retrieving page 0 for state {state_id} in {year}...")
+    envelope = await fetch_first_page(client, search, page_size, archive, probe_pages)
+    
+    if envelope is not None and tuned and len(page_records(envelope)) >= page_size:
+        # The fewest records the result set can have; more than an earlier
+        # probe ran out at means the page size is probed again
+        total_pages = result_size(envelope, page_size)
+        at_least = max(len(page_records(envelope)) + 1, ((total_pages or 1) - 1) * page_size + 1)
+        if not client.page_sizes.is_known("advanceSearchData", at_least):
+            tuned_size = await client.tune_page_size(
+                state_id, year, workers=MAX_WORKERS, major_clearance_type=major_clearance_type,
+                result_size=at_least, probe_pages=probe_pages
+            )
+            if tuned_size != page_size:
+                page_size = tuned_size
+                logger.info(f"Using page size {page_size}")
+                envelope = await fetch_first_page(client, search, page_size, archive, probe_pages)
+    
+    if envelope is None:
+        logger.error("Failed to retrieve the first page of results")
+        raise IncompleteCrawlError([0], 0)
+    
+    first_page = page_records(envelope)
+    logger.info(f"Retrieved {len(first_page)} proposals from page 0")
+    total_pages = result_size(envelope, page_size)
+    if total_pages is not None and total_pages <= 1 and len(first_page) >= page_size:
+        # A full first page means there may be more; the reported size is not the whole result set
+        logger.warning(f"Ignoring a reported size of {total_pages} pages, page 0 came back full")
+        total_pages = None
+    accept(0, first_page)
+    
+    if total > page_size:
+        # The server ignored the page size and sent the whole result set at once
+        logger.info(f"Page 0 returned all {total} proposals in one response")
+    elif total_pages is not None:
+        logger.info(f"Server reports {total_pages} pages of {page_size} proposals")
+        if total_pages > 1:
+            last_page = total_pages - 1
+            logger.info(f"Retrieving pages 1-{last_page} with {MAX_WORKERS} workers...")
+            missing = await fetch_pages(client, search, range(1, total_pages), page_size, last_page, archive, accept)
+            if missing:
+                raise incomplete(missing)
+    elif total < page_size:
+        logger.info("Reached end of results on page 0")
+    else:
+        logger.info("Server reports no result size, fetching until a short page")
+        failed_page = await fetch_until_short_page(client, search, page_size, archive, accept)
+        if failed_page is not None:
+            raise incomplete([failed_page])
+    
+    return total
+
+async def crawl_proposals(client, state_id, year, major_clearance_type=1, page_size=None, archive=None):
+    """Crawl every advanceSearchData page for a state and year and return the proposals in page order."""
+    all_proposals = []
+    await stream_proposals(
+        client, state_id, year, lambda page, proposals: all_proposals.extend(proposals),
+        major_clearance_type=major_clearance_type, page_size=page_size, archive=archive
+    )
+    return all_proposals
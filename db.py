@@ -0,0 +1,53 @@
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+from raw_json_codec import register_functions
+
+# Seconds a connection waits on a locked database before giving up
+BUSY_TIMEOUT = 30
+
+# Page cache per connection, in KiB (a negative cache_size is read as KiB)
+CACHE_SIZE_KIB = 64 * 1024
+
+# Bytes of the database file read through a memory map instead of read()
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+def apply_pragmas(conn):
+    """Apply the read-side performance profile shared by every connection.
+
+    Also registers decode_raw_json(), which the proposal_details_json
+    view needs to show the compressed raw_json as text.
+    """
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}")
+    register_functions(conn)
+
+
+def connect(db_path, **kwargs):
+    """Open a database for reading and writing with the shared PRAGMA profile.
+
+    The database is switched to WAL with synchronous=NORMAL, so readers
+    never block the writer and a commit costs no fsync until checkpoint.
+    Other keyword arguments are passed on to sqlite3.connect.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, **kwargs)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    apply_pragmas(conn)
+    return conn
+
+
+def connect_readonly(db_path, **kwargs):
+    """Open an existing database read-only, for the reporting tools.
+
+    A read-only connection cannot create the file or change the schema
+    by accident, and in WAL mode it reads alongside a running import.
+    """
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT, **kwargs)
+    apply_pragmas(conn)
+    return conn
@@ -0,0 +1,536 @@
+import json
+import logging
+
+from raw_json_codec import TRAIN_SAMPLES, RawJsonCodec, register_functions
+from record_mapper import PROPOSAL_COLUMNS, build_proposal_row
+
+logger = logging.getLogger(__name__)
+
+# Columns of each table, in the order they are created
+TABLES = {
+    "proposals": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proposal_id TEXT UNIQUE,
+        sw_no TEXT,
+        project_name TEXT,
+        company_name TEXT,
+        state TEXT,
+        category TEXT,
+        sector TEXT,
+        current_status TEXT,
+        proposal_type TEXT,
+        clearance_type TEXT,
+        submission_date TEXT,
+        last_updated TEXT,
+        year INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        issuing_authority TEXT,
+        caf_number TEXT,
+        form_id INTEGER,
+        certificate_url TEXT
+    ''',
+    "proposal_details": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proposal_id TEXT UNIQUE,
+        raw_json TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
+    ''',
+    "proposal_timelines": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proposal_id TEXT,
+        status TEXT,
+        date TEXT,
+        remarks TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
+    ''',
+    "project_locations": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proposal_id TEXT,
+        location_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
+    ''',
+    "proposal_forms": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proposal_id TEXT,
+        form_type TEXT,
+        form_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
+    ''',
+    "documents": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proposal_id TEXT,
+        document_type TEXT,
+        document_name TEXT,
+        document_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
+    ''',
+    "proposal_properties": '''
+        proposal_id TEXT NOT NULL,
+        label TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (proposal_id, label, value),
+        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
+    '''
+}
+
+# Names the older scripts under backup/ gave to the current columns
+LEGACY_COLUMNS = {
+    "proposals": {
+        "proposal_id": ("proposalNo",),
+        "sw_no": ("swNo", "s_w_no"),
+        "project_name": ("projectName", "proposal_title"),
+        "company_name": ("companyName",),
+        "state": ("stateName",),
+        "category": ("categoryName",),
+        "sector": ("sectorName",),
+        "current_status": ("proposalStatus", "proposal_status"),
+        "proposal_type": ("proposalType",),
+        "clearance_type": ("clearanceTypeName",),
+        "submission_date": ("lastSubmissionDate", "last_submission_date"),
+        "last_updated": ("lastStatusDate", "last_status_date")
+    },
+    "proposal_details": {
+        "proposal_id": ("proposalNo",),
+        "raw_json": ("proposal_json",)
+    },
+    "proposal_timelines": {
+        "id": ("timeline_id",),
+        "proposal_id": ("proposalNo",)
+    },
+    "project_locations": {
+        "id": ("location_id",),
+        "proposal_id": ("proposalNo",),
+        "location_data": ("kml_data", "kml_file_content")
+    },
+    "proposal_forms": {
+        "id": ("form_id",),
+        "proposal_id": ("proposalNo",),
+        "form_data": ("form_content",)
+    },
+    "documents": {
+        "id": ("doc_id",),
+        "proposal_id": ("proposalNo",),
+        "document_name": ("doc_name",),
+        "document_url": ("document_link", "doc_url")
+    }
+}
+
+# proposals columns for the Level 1 record fields queries filter on; the
+# record keys they are read from are in record_mapper.PROPOSAL_FIELDS
+RAW_JSON_COLUMNS = (
+    "issuing_authority",
+    "caf_number",
+    "form_id",
+    "certificate_url",
+    "company_name",
+    "submission_date",
+    "last_updated"
+)
+
+# proposals columns the importers used to read from keys the records do not have
+REMAPPED_COLUMNS = ("sw_no", "state", "category", "sector", "clearance_type")
+
+# Indexes on those columns, e.g. for "SEIAA proposals updated this week"
+RAW_JSON_INDEXES = {
+    "idx_proposals_authority_updated": ("proposals", ("issuing_authority", "last_updated")),
+    "idx_proposals_last_updated": ("proposals", ("last_updated",)),
+    "idx_proposals_submission_date": ("proposals", ("submission_date",)),
+    "idx_proposals_form_id": ("proposals", ("form_id",)),
+    "idx_proposals_caf_number": ("proposals", ("caf_number",))
+}
+
+# Index for breakdowns by property, such as proposals per Activity; with the
+# primary key it also covers proposal_id
+PROPERTY_INDEXES = {
+    "idx_proposal_properties_label_value": ("proposal_properties", ("label", "value"))
+}
+
+# Rows changed per transaction when a migration rewrites existing data
+MIGRATION_BATCH = 10000
+
+# Natural key of each Level 2 table. Re-imports update the row with the same
+# key instead of adding another one.
+NATURAL_KEYS = {
+    "proposal_timelines": ("proposal_id", "status", "date"),
+    "project_locations": ("proposal_id",),
+    "proposal_forms": ("proposal_id", "form_type"),
+    "documents": ("proposal_id", "document_type", "document_name")
+}
+
+# Indexes for the columns reports filter on. Lookups by proposal_id are
+# served by the natural-key indexes, which all start with it.
+SECONDARY_INDEXES = {
+    "idx_proposals_state_year_status": ("proposals", ("state", "year", "current_status")),
+    "idx_proposal_timelines_status_date": ("proposal_timelines", ("status", "date"))
+}
+
+# Rows ANALYZE samples per index, so statistics stay cheap on a large database
+ANALYSIS_LIMIT = 1000
+
+
+def ensure_natural_keys(cursor):
+    """Add a unique index on the natural key of each Level 2 table.
+
+    Duplicates left by earlier runs are removed first, keeping the newest
+    row of each key. Tables that already have their index are left alone.
+    """
+    for table, key in NATURAL_KEYS.items():
+        index = f"uq_{table}_natural_key"
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index,))
+        if cursor.fetchone():
+            continue
+
+        columns = ", ".join(key)
+        cursor.execute(f"DELETE FROM {table} WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY {columns})")
+        if cursor.rowcount > 0:
+            logger.info(f"Removed {cursor.rowcount} duplicate rows from {table}")
+        cursor.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({columns})")
+
+
+def ensure_indexes(cursor):
+    """Create the natural-key and secondary indexes that do not exist yet."""
+    ensure_natural_keys(cursor)
+    for index, (table, columns) in SECONDARY_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(columns)})")
+
+
+def analyze(conn):
+    """Refresh the query planner's statistics, e.g. after a bulk load, and commit."""
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+# Upserts for each Level 2 table, keyed on its natural key
+LEVEL2_UPSERTS = {
+    'proposal_timelines': '''
+    INSERT INTO proposal_timelines (proposal_id, status, date, remarks) VALUES (?, ?, ?, ?)
+    ON CONFLICT(proposal_id, status, date) DO UPDATE SET
+        remarks = excluded.remarks
+    WHERE remarks IS NOT excluded.remarks
+    ''',
+    'project_locations': '''
+    INSERT INTO project_locations (proposal_id, location_data) VALUES (?, ?)
+    ON CONFLICT(proposal_id) DO UPDATE SET
+        location_data = excluded.location_data
+    WHERE location_data IS NOT excluded.location_data
+    ''',
+    'proposal_forms': '''
+    INSERT INTO proposal_forms (proposal_id, form_type, form_data) VALUES (?, ?, ?)
+    ON CONFLICT(proposal_id, form_type) DO UPDATE SET
+        form_data = excluded.form_data
+    WHERE form_data IS NOT excluded.form_data
+    ''',
+    'documents': '''
+    INSERT INTO documents (proposal_id, document_type, document_name, document_url) VALUES (?, ?, ?, ?)
+    ON CONFLICT(proposal_id, document_type, document_name) DO UPDATE SET
+        document_url = excluded.document_url
+    WHERE document_url IS NOT excluded.document_url
+    '''
+}
+
+
+def property_rows(proposal_id, record):
+    """Return the proposal_properties rows of a Level 1 record.
+
+    other_property holds a JSON list of {"label": ..., "value": ...}
+    encoded as a string inside the record; it is decoded here once so
+    readers never have to.
+    """
+    properties = record.get('other_property')
+    if isinstance(properties, str):
+        try:
+            properties = json.loads(properties)
+        except ValueError:
+            return []
+    if not isinstance(properties, list):
+        return []
+
+    rows = (
+        (proposal_id, str(item['label']), '' if item.get('value') is None else str(item['value']))
+        for item in properties
+        if isinstance(item, dict) and item.get('label')
+    )
+    return list(dict.fromkeys(rows))
+
+
+def write_properties(cursor, proposal_ids, rows):
+    """Replace the properties of the given proposals with rows; the caller commits."""
+    cursor.executemany("DELETE FROM proposal_properties WHERE proposal_id = ?", [(proposal_id,) for proposal_id in proposal_ids])
+    cursor.executemany(
+        "INSERT INTO proposal_properties (proposal_id, label, value) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+        rows
+    )
+
+
+def level2_rows(proposal_id, level2):
+    """Return the rows of a proposal's Level 2 data for each table.
+
+    Natural key columns are stored as '' rather than NULL, since NULLs
+    never conflict in a unique index.
+    """
+    location = level2['location']
+    return {
+        'proposal_timelines': [
+            (proposal_id, timeline.get('status') or '', timeline.get('date') or '', timeline.get('remarks', ''))
+            for timeline in level2['timelines'] or []
+        ],
+        'project_locations': [
+            (proposal_id, json.dumps(location) if isinstance(location, dict) else location)
+        ] if location else [],
+        'proposal_forms': [
+            (proposal_id, form_type, json.dumps(form_data))
+            for form_type, form_data in (level2['forms'] or {}).items()
+        ],
+        'documents': [
+            (
+                proposal_id,
+                document.get('documentType') or '',
+                document.get('documentName') or '',
+                document.get('documentUrl', '')
+            )
+            for document in level2['documents'] or []
+        ]
+    }
+
+
+def write_level2_rows(cursor, rows):
+    """Upsert rows from level2_rows with one executemany per table; the caller commits."""
+    for table, table_rows in rows.items():
+        if table_rows:
+            cursor.executemany(LEVEL2_UPSERTS[table], table_rows)
+
+
+def table_columns(conn, table):
+    """Return the column names of a table, or an empty list if it does not exist."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def backfill(conn, table, assignment, condition):
+    """Run UPDATE table SET assignment WHERE condition in rowid batches.
+
+    Each batch is committed on its own, so a large table is rewritten
+    without one huge transaction. condition must exclude rows already
+    done, so an interrupted backfill can simply be run again.
+    """
+    last_rowid = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+    updated = 0
+    for start in range(0, last_rowid, MIGRATION_BATCH):
+        cursor = conn.execute(
+            f"UPDATE {table} SET {assignment} WHERE rowid > ? AND rowid <= ? AND ({condition})",
+            (start, start + MIGRATION_BATCH)
+        )
+        updated += cursor.rowcount
+        conn.commit()
+    if updated:
+        logger.info(f"Backfilled {updated} rows of {table}")
+    return updated
+
+
+def upgrade_legacy_columns(conn, table):
+    """Bring an existing table's columns in line with TABLES, in place.
+
+    Columns the older scripts named differently are renamed and missing
+    columns are added; both only touch the schema, not the rows. Columns
+    the current code does not know about are kept.
+    """
+    columns = table_columns(conn, table)
+    for column, legacy_names in LEGACY_COLUMNS.get(table, {}).items():
+        legacy = next((name for name in legacy_names if name in columns), None)
+        if column not in columns and legacy:
+            conn.execute(f"ALTER TABLE {table} RENAME COLUMN {legacy} TO {column}")
+            logger.info(f"Renamed {table}.{legacy} to {column}")
+
+    columns = table_columns(conn, table)
+    for definition in TABLES[table].strip().splitlines():
+        column, column_type = definition.strip().rstrip(",").split()[:2]
+        if column in columns or column in ("FOREIGN", "PRIMARY"):
+            continue
+        if column == "id":
+            # A primary key cannot be added in place; the table keeps its own
+            logger.info(f"Table {table} has no id column, leaving its primary key as it is")
+            continue
+        # ADD COLUMN only accepts constant defaults, so created_at gets none
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        logger.info(f"Added column {table}.{column}")
+
+
+def migrate_to_current_tables(conn):
+    """Create the tables and bring the older scripts' schemas up to date."""
+    for table, body in TABLES.items():
+        if table_columns(conn, table):
+            upgrade_legacy_columns(conn, table)
+        else:
+            conn.execute(f"CREATE TABLE {table} ({body.rstrip()}\n)")
+    conn.commit()
+
+    # Data the older schemas kept in other shapes
+    backfill(conn, "proposals", "year = CAST(substr(proposal_id, -4) AS INTEGER)",
+             "year IS NULL AND substr(proposal_id, -4) GLOB '[0-9][0-9][0-9][0-9]'")
+    other_columns = [
+        column for column in table_columns(conn, "proposal_details")
+        if column not in ("id", "proposal_id", "raw_json", "created_at")
+    ]
+    if other_columns:
+        pairs = ", ".join(f"'{column}', {column}" for column in other_columns)
+        backfill(conn, "proposal_details", f"raw_json = json_object({pairs})", "raw_json IS NULL")
+
+
+def migrate_indexes(conn):
+    """Add the natural-key and secondary indexes."""
+    # NULLs never conflict in a unique index, so keys are stored as ''
+    for table, key in NATURAL_KEYS.items():
+        for column in key:
+            backfill(conn, table, f"{column} = ''", f"{column} IS NULL")
+    ensure_indexes(conn.cursor())
+
+
+def migrate_compressed_raw_json(conn):
+    """Compress proposal_details.raw_json with a dictionary trained on the stored records."""
+    RawJsonCodec.create_table(conn)
+    codec = RawJsonCodec.load(conn)
+    if codec.dictionary is None:
+        samples = [
+            text for text, in conn.execute(
+                "SELECT raw_json FROM proposal_details WHERE typeof(raw_json) = 'text' ORDER BY random() LIMIT ?",
+                (TRAIN_SAMPLES,)
+            )
+        ]
+        # An empty database gets its dictionary from the first import instead
+        if samples:
+            codec.train(samples)
+    conn.commit()
+
+    if codec.dictionary is not None:
+        register_functions(conn, codec)
+        if backfill(conn, "proposal_details", "raw_json = encode_raw_json(raw_json)", "typeof(raw_json) = 'text'"):
+            logger.info("Run VACUUM to give the space freed by compression back to the filesystem")
+
+    # Readers that want the JSON text; needs decode_raw_json(), which db.connect registers
+    conn.execute(
+        "CREATE VIEW IF NOT EXISTS proposal_details_json AS "
+        "SELECT proposal_id, decode_raw_json(raw_json) AS raw_json FROM proposal_details"
+    )
+
+
+def refill_proposal_columns(conn, columns):
+    """Set proposals columns from the stored raw_json, with the mapping the importers use.
+
+    Records are decoded in Python in rowid batches; a column is only
+    changed where the record has a value for it.
+    """
+    codec = RawJsonCodec.load(conn)
+    positions = [PROPOSAL_COLUMNS.index(column) for column in columns]
+    assignments = ", ".join(f"{column} = COALESCE(?, {column})" for column in columns)
+
+    last_rowid = conn.execute("SELECT MAX(rowid) FROM proposal_details").fetchone()[0] or 0
+    updated = 0
+    for start in range(0, last_rowid, MIGRATION_BATCH):
+        rows = conn.execute(
+            "SELECT proposal_id, raw_json FROM proposal_details WHERE rowid > ? AND rowid <= ? AND raw_json IS NOT NULL",
+            (start, start + MIGRATION_BATCH)
+        ).fetchall()
+        updates = []
+        for proposal_id, raw_json in rows:
+            try:
+                record = codec.loads(raw_json)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                row = build_proposal_row(record)
+                updates.append(tuple(row[position] for position in positions) + (proposal_id,))
+        conn.executemany(f"UPDATE proposals SET {assignments} WHERE proposal_id = ?", updates)
+        updated += len(updates)
+        conn.commit()
+    return updated
+
+
+def migrate_raw_json_columns(conn):
+    """Add typed, indexed proposals columns for fields that were only in raw_json."""
+    upgrade_legacy_columns(conn, "proposals")
+    updated = refill_proposal_columns(conn, RAW_JSON_COLUMNS)
+    if updated:
+        logger.info(f"Filled the raw_json columns of {updated} proposals")
+
+    for index, (table, columns) in RAW_JSON_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(columns)})")
+
+
+def migrate_proposal_properties(conn):
+    """Add proposal_properties, filled from the other_property of the stored records."""
+    if not table_columns(conn, "proposal_properties"):
+        conn.execute(f"CREATE TABLE proposal_properties ({TABLES['proposal_properties'].rstrip()}\n)")
+    for index, (table, columns) in PROPERTY_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(columns)})")
+    conn.commit()
+
+    codec = RawJsonCodec.load(conn)
+    last_rowid = conn.execute("SELECT MAX(rowid) FROM proposal_details").fetchone()[0] or 0
+    filled = 0
+    for start in range(0, last_rowid, MIGRATION_BATCH):
+        rows = conn.execute(
+            "SELECT proposal_id, raw_json FROM proposal_details WHERE rowid > ? AND rowid <= ? AND raw_json IS NOT NULL",
+            (start, start + MIGRATION_BATCH)
+        ).fetchall()
+        proposal_ids = []
+        properties = []
+        for proposal_id, raw_json in rows:
+            try:
+                record = codec.loads(raw_json)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                proposal_ids.append(proposal_id)
+                properties.extend(property_rows(proposal_id, record))
+        write_properties(conn, proposal_ids, properties)
+        filled += len(properties)
+        conn.commit()
+    if filled:
+        logger.info(f"Filled proposal_properties with {filled} properties")
+
+
+def migrate_remapped_columns(conn):
+    """Fill the proposals columns that were read from the wrong record keys."""
+    updated = refill_proposal_columns(conn, REMAPPED_COLUMNS)
+    if updated:
+        logger.info(f"Refilled {', '.join(REMAPPED_COLUMNS)} of {updated} proposals")
+
+
+# Schema versions, in order; PRAGMA user_version holds the last one applied
+MIGRATIONS = [
+    (1, migrate_to_current_tables),
+    (2, migrate_indexes),
+    (3, migrate_compressed_raw_json),
+    (4, migrate_raw_json_columns),
+    (5, migrate_proposal_properties),
+    (6, migrate_remapped_columns)
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """Apply the migrations the database has not had yet, in order.
+
+    Each migration is recorded in PRAGMA user_version as soon as it is
+    done, so a database is only ever changed in place and never
+    reloaded. Returns the schema version the database is at.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        logger.warning(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+        return version
+
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info(f"Migrating database to schema version {target}: {migration.__doc__}")
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {target}")
+        conn.commit()
+        version = target
+    return version
@@ -0,0 +1,137 @@
+import logging
+import os
+import shutil
+import sys
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from db import connect_readonly
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# Rows read from SQLite and converted to Arrow at a time
+EXPORT_BATCH_ROWS = 50000
+
+# Every dataset is written in hive style directories, state=.../year=...
+PARTITIONING = ds.partitioning(pa.schema([("state", pa.string()), ("year", pa.int32())]), flavor="hive")
+
+# Columns that are not text; all others are exported as strings
+COLUMN_TYPES = {
+    "year": pa.int32(),
+    "form_id": pa.int64()
+}
+
+# Text columns with few distinct values, kept dictionary-encoded in Arrow as
+# well as in the Parquet pages so readers get categoricals without a pass
+DICTIONARY_COLUMNS = {
+    "category", "sector", "current_status", "proposal_type", "clearance_type", "issuing_authority",
+    "status", "label", "value"
+}
+
+# What is exported, by dataset name; tables without state and year get them from proposals
+EXPORTS = {
+    "proposals": '''
+        SELECT proposal_id, sw_no, project_name, company_name, category, sector, current_status,
+               proposal_type, clearance_type, submission_date, last_updated, issuing_authority,
+               caf_number, form_id, certificate_url, state, year
+        FROM proposals
+    ''',
+    "proposal_timelines": '''
+        SELECT t.proposal_id, t.status, t.date, t.remarks, p.state, p.year
+        FROM proposal_timelines t LEFT JOIN proposals p USING (proposal_id)
+    ''',
+    "proposal_properties": '''
+        SELECT pp.proposal_id, pp.label, pp.value, p.state, p.year
+        FROM proposal_properties pp LEFT JOIN proposals p USING (proposal_id)
+    '''
+}
+
+def column_type(column):
+    """Arrow type a column is exported with."""
+    if column in DICTIONARY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return COLUMN_TYPES.get(column, pa.string())
+
+def record_batches(cursor, schema, batch_rows=EXPORT_BATCH_ROWS):
+    """Yield the rows of an executed query as Arrow record batches."""
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            break
+        arrays = []
+        for position, field in enumerate(schema):
+            values = [row[position] for row in rows]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def export_table(conn, name, query, out_dir):
+    """Write one query to a Parquet dataset partitioned by state and year, replacing an older export."""
+    cursor = conn.cursor()
+    cursor.execute(query)
+    schema = pa.schema([(column[0], column_type(column[0])) for column in cursor.description])
+
+    path = os.path.join(out_dir, name)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    ds.write_dataset(
+        record_batches(cursor, schema),
+        path,
+        schema=schema,
+        format="parquet",
+        partitioning=PARTITIONING,
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd", use_dictionary=True)
+    )
+    logger.info(f"Exported {name} to {path}")
+
+def export_database(db_path, out_dir="parquet"):
+    """Export proposals, their timelines and their properties to partitioned Parquet.
+
+    Analyses can then read just the columns and partitions they need,
+    e.g. pandas.read_parquet("parquet/proposals", columns=["current_status"],
+    filters=[("state", "=", "TELANGANA"), ("year", "=", 2024)]).
+    """
+    if not os.path.exists(db_path):
+        logger.error(f"Database file {db_path} not found")
+        return False
+
+    try:
+        # write_dataset pulls the record batches from one of its own threads
+        conn = connect_readonly(db_path, check_same_thread=False)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        os.makedirs(out_dir, exist_ok=True)
+        for name, query in EXPORTS.items():
+            if name not in tables:
+                logger.warning(f"Table {name} not found, run final_import.py to migrate the database")
+                continue
+            export_table(conn, name, query, out_dir)
+        conn.close()
+        return True
+
+    except Exception as e:
+        logger.error(f"Error exporting database: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+if __name__ == "__main__":
+    db_path = "parivesh.db"
+    out_dir = "parquet"
+
+    if len(sys.argv) > 1:
+        db_path = sys.argv[1]
+
+    if len(sys.argv) > 2:
+        out_dir = sys.argv[2]
+
+    export_database(db_path, out_dir)
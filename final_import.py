@@ -1,10 +1,21 @@
-import json
-import sqlite3
+import asyncio
 import logging
 import os
-import time
-import requests
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+
+import aiohttp
+
+from db import connect, connect_readonly
+from db_schema import (
+    LEVEL2_UPSERTS, analyze, level2_rows, migrate, property_rows, write_level2_rows, write_properties
+)
+from ndjson_stream import read_records
+from parivesh_client import PariveshClient
+from import_ledger import DONE, FAILED, LEVEL1, SKIPPED, ImportLedger
+from raw_json_codec import TRAIN_SAMPLES, RawJsonCodec
+from record_mapper import PROPOSAL_DETAILS_UPSERT, PROPOSAL_UPSERT, proposal_record_rows
+from request_planner import FORM_ENDPOINTS, FORM_TYPES, FormApplicability, is_empty_form, plan_requests
 
 # Set up logging
 logging.basicConfig(
@@ -14,431 +25,402 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Seconds allowed for all Level 2 requests of one proposal
+LEVEL2_DEADLINE = 120
+
+# Number of proposals whose Level 2 data is fetched at the same time
+FETCH_WORKERS = 8
+
+# The writer group-commits once it holds this many rows, or this many
+# milliseconds after the first proposal of the group arrived
+WRITE_BATCH_ROWS = 2000
+WRITE_INTERVAL_MS = 500
+
+# Proposals waiting for the writer before fetch workers are held back
+WRITE_QUEUE_SIZE = 100
+
 def setup_database(db_path):
-    """Set up the database with the correct schema."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Drop existing tables if they exist
-    tables = [
-        "proposals",
-        "proposal_details",
-        "proposal_timelines",
-        "project_locations",
-        "proposal_forms",
-        "documents"
-    ]
-    
-    for table in tables:
-        cursor.execute(f"DROP TABLE IF EXISTS {table}")
-    
-    # Create proposals table (Level 1)
-    cursor.execute('''
-    CREATE TABLE proposals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT UNIQUE,
-        sw_no TEXT,
-        project_name TEXT,
-        company_name TEXT,
-        state TEXT,
-        category TEXT,
-        sector TEXT,
-        current_status TEXT,
-        proposal_type TEXT,
-        clearance_type TEXT,
-        submission_date TEXT,
-        last_updated TEXT,
-        year INTEGER,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create proposal_details table (Level 2a)
-    cursor.execute('''
-    CREATE TABLE proposal_details (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT UNIQUE,
-        raw_json TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create proposal_timelines table (Level 2a)
-    cursor.execute('''
-    CREATE TABLE proposal_timelines (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        status TEXT,
-        date TEXT,
-        remarks TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create project_locations table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE project_locations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        location_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create proposal_forms table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE proposal_forms (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        form_type TEXT,
-        form_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create documents table (Level 2b)
-    cursor.execute('''
-    CREATE TABLE documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        document_type TEXT,
-        document_name TEXT,
-        document_url TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    conn.commit()
+    """Bring the database up to the current schema version in place, keeping its data."""
+    conn = connect(db_path)
+    version = migrate(conn)
     conn.close()
-    logger.info(f"Database {db_path} setup complete with fresh schema")
+    logger.info(f"Database {db_path} setup complete (schema version {version})")
 
-def get_proposal_timelines(proposal_id, session, headers):
-    """Get timeline information for a proposal."""
-    url = "https://parivesh.nic.in/parivesh_api/trackYourProposal/getApprovalDates"
-    params = {"proposalNo": proposal_id}
+async def get_proposal_timelines(proposal_id, client):
+    """Get timeline information for a proposal.
     
+    Like the other Level 2 getters, a 4xx response counts as an answer
+    with nothing in it; server errors and other failures are raised.
+    """
     try:
-        response = session.get(url, params=params, headers=headers, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Handle different response formats
-            if isinstance(data, list):
-                return data
-            elif isinstance(data, dict) and 'data' in data:
-                return data['data'] if isinstance(data['data'], list) else []
-            else:
-                logger.warning(f"Unexpected timeline response format for proposal {proposal_id}")
-                return []
+        data = await client.get_approval_dates(proposal_id)
+        
+        # Handle different response formats
+        if isinstance(data, list):
+            return data
+        elif isinstance(data, dict) and 'data' in data:
+            return data['data'] if isinstance(data['data'], list) else []
         else:
-            logger.warning(f"Failed to get timelines for proposal {proposal_id}: {response.status_code}")
+            logger.warning(f"Unexpected timeline response format for proposal {proposal_id}")
             return []
+    except aiohttp.ClientResponseError as e:
+        logger.warning(f"Failed to get timelines for proposal {proposal_id}: {e.status}")
+        if e.status >= 500:
+            raise
+        return []
     except Exception as e:
         logger.error(f"Error getting timelines for proposal {proposal_id}: {str(e)}")
-        return []
+        raise
 
-def get_project_location(proposal_id, session, headers):
-    """Get the KML file for a project's location."""
-    # First, get the form ID
-    url = "https://parivesh.nic.in/parivesh_api/trackYourProposal/dataOfProposalNo"
-    params = {"proposalNo": proposal_id}
+async def get_project_location(proposal_id, client, form_id=None):
+    """Get the KML file for a project's location.
     
+    The form ID is looked up with dataOfProposalNo unless it is already known.
+    """
     try:
-        response = session.get(url, params=params, headers=headers, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Extract form ID
-            form_id = None
+        if not form_id:
+            data = await client.data_of_proposal_no(proposal_id)
             if isinstance(data, dict):
                 form_id = data.get('formId')
-            
-            if not form_id:
-                logger.warning(f"Form ID not found for proposal {proposal_id}")
-                return None
-            
-            # Get KML file
-            kml_url = "https://parivesh.nic.in/parivesh_api/trackYourProposal/getKmlFile"
-            kml_params = {"formId": form_id}
-            
-            kml_response = session.get(kml_url, params=kml_params, headers=headers, timeout=30)
-            if kml_response.status_code == 200:
-                try:
-                    return kml_response.json()
-                except:
-                    # If not JSON, return the text
-                    return kml_response.text
-            else:
-                logger.warning(f"Failed to get KML file for proposal {proposal_id}: {kml_response.status_code}")
-                return None
-        else:
-            logger.warning(f"Failed to get form ID for proposal {proposal_id}: {response.status_code}")
+        
+        if not form_id:
+            logger.warning(f"Form ID not found for proposal {proposal_id}")
             return None
+        
+        # Get KML file; non-JSON responses come back as text
+        return await client.get_kml_file(form_id)
+    except aiohttp.ClientResponseError as e:
+        logger.warning(f"Failed to get project location for proposal {proposal_id}: {e.status}")
+        if e.status >= 500:
+            raise
+        return None
     except Exception as e:
         logger.error(f"Error getting project location for proposal {proposal_id}: {str(e)}")
-        return None
+        raise
 
-def get_proposal_forms(proposal_id, session, headers):
-    """Get various forms for a proposal."""
-    forms = {}
-    base_url = "https://parivesh.nic.in/parivesh_api/trackYourProposal"
-    params = {"proposalNo": proposal_id}
+async def get_proposal_forms(proposal_id, client, form_types=FORM_TYPES, observe=None):
+    """Get various forms for a proposal, limited to the given form types.
     
-    # Get CAF form
-    try:
-        caf_url = f"{base_url}/getCaFormDetails"
-        caf_response = session.get(caf_url, params=params, headers=headers, timeout=30)
-        if caf_response.status_code == 200:
-            forms['caf'] = caf_response.json()
-    except Exception as e:
-        logger.error(f"Error getting CAF form for proposal {proposal_id}: {str(e)}")
-    
-    # Get Part A form
-    try:
-        part_a_url = f"{base_url}/getPartADetails"
-        part_a_response = session.get(part_a_url, params=params, headers=headers, timeout=30)
-        if part_a_response.status_code == 200:
-            forms['part_a'] = part_a_response.json()
-    except Exception as e:
-        logger.error(f"Error getting Part A form for proposal {proposal_id}: {str(e)}")
-    
-    # Get Part B form
-    try:
-        part_b_url = f"{base_url}/getPartBDetails"
-        part_b_response = session.get(part_b_url, params=params, headers=headers, timeout=30)
-        if part_b_response.status_code == 200:
-            forms['part_b'] = part_b_response.json()
-    except Exception as e:
-        logger.error(f"Error getting Part B form for proposal {proposal_id}: {str(e)}")
-    
-    # Get Part C form
-    try:
-        part_c_url = f"{base_url}/getPartCDetails"
-        part_c_response = session.get(part_c_url, params=params, headers=headers, timeout=30)
-        if part_c_response.status_code == 200:
-            forms['part_c'] = part_c_response.json()
-    except Exception as e:
-        logger.error(f"Error getting Part C form for proposal {proposal_id}: {str(e)}")
+    observe(form_type, present) is told, for every form the server answered,
+    whether it came back with data.
+    """
+    forms = {}
+    form_getters = [
+        ('caf', "CAF", client.get_ca_form_details),
+        ('part_a', "Part A", client.get_part_a_details),
+        ('part_b', "Part B", client.get_part_b_details),
+        ('part_c', "Part C", client.get_part_c_details)
+    ]
+    form_getters = [form_getter for form_getter in form_getters if form_getter[0] in form_types]
     
-    return forms
+    async def get_form(form_type, form_name, getter):
+        try:
+            forms[form_type] = await getter(proposal_id)
+            if observe:
+                observe(form_type, not is_empty_form(forms[form_type]))
+        except aiohttp.ClientResponseError as e:
+            # A client error means there is no such form for this proposal
+            if observe and 400 <= e.status < 500:
+                observe(form_type, False)
+        except Exception as e:
+            logger.error(f"Error getting {form_name} form for proposal {proposal_id}: {str(e)}")
+    
+    await asyncio.gather(*(get_form(*form_getter) for form_getter in form_getters))
+    
+    # Keep the forms in their usual order whatever order they arrived in
+    return {form_type: forms[form_type] for form_type, _, _ in form_getters if form_type in forms}
 
-def get_documents(proposal_id, session, headers):
+async def get_documents(proposal_id, client):
     """Get documents associated with a proposal."""
-    url = "https://parivesh.nic.in/parivesh_api/trackYourProposal/getDocuments"
-    params = {"proposalNo": proposal_id}
-    
     try:
-        response = session.get(url, params=params, headers=headers, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            
-            if isinstance(data, list):
-                return data
-            elif isinstance(data, dict) and 'data' in data:
-                return data['data'] if isinstance(data['data'], list) else []
-            else:
-                logger.warning(f"Unexpected documents response format for proposal {proposal_id}")
-                return []
+        data = await client.get_documents(proposal_id)
+        
+        if isinstance(data, list):
+            return data
+        elif isinstance(data, dict) and 'data' in data:
+            return data['data'] if isinstance(data['data'], list) else []
         else:
-            logger.warning(f"Failed to get documents for proposal {proposal_id}: {response.status_code}")
+            logger.warning(f"Unexpected documents response format for proposal {proposal_id}")
             return []
+    except aiohttp.ClientResponseError as e:
+        logger.warning(f"Failed to get documents for proposal {proposal_id}: {e.status}")
+        if e.status >= 500:
+            raise
+        return []
     except Exception as e:
         logger.error(f"Error getting documents for proposal {proposal_id}: {str(e)}")
-        return []
+        raise
+
+async def fetch_level2_data(plan, client, deadline=LEVEL2_DEADLINE, applicability=None):
+    """Fetch the Level 2a and Level 2b data in a proposal's RequestPlan concurrently.
+    
+    Parts that are not back within the deadline are cancelled and left empty.
+    Which forms came back empty is reported to the FormApplicability, if any.
+    The endpoints that answered are listed under 'answered'.
+    """
+    proposal_id = plan.proposal_id
+    answered_forms = set()
+    
+    def observe(form_type, present):
+        answered_forms.add(form_type)
+        if applicability is not None:
+            applicability.observe(plan.clearance_type, plan.proposal_type, form_type, present)
+    
+    tasks = {}
+    if plan.needs("getApprovalDates"):
+        tasks['timelines'] = asyncio.create_task(get_proposal_timelines(proposal_id, client))
+    if plan.needs("getKmlFile"):
+        tasks['location'] = asyncio.create_task(get_project_location(proposal_id, client, plan.form_id))
+    if plan.forms:
+        tasks['forms'] = asyncio.create_task(get_proposal_forms(proposal_id, client, plan.forms, observe))
+    if plan.needs("getDocuments"):
+        tasks['documents'] = asyncio.create_task(get_documents(proposal_id, client))
+    
+    done, pending = set(), set()
+    if tasks:
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    
+    if pending:
+        late = [name for name, task in tasks.items() if task in pending]
+        logger.warning(f"Level 2 deadline of {deadline}s passed for proposal {proposal_id}, giving up on {late}")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    level2 = {'timelines': [], 'location': None, 'forms': {}, 'documents': [], 'answered': set()}
+    endpoints = {'timelines': "getApprovalDates", 'location': "getKmlFile", 'documents': "getDocuments"}
+    for name, task in tasks.items():
+        if task not in done or task.exception() is not None:
+            continue
+        level2[name] = task.result()
+        if name == 'forms':
+            level2['answered'].update(FORM_ENDPOINTS[form_type] for form_type in answered_forms)
+        else:
+            level2['answered'].add(endpoints[name])
+    return level2
+
+def level2_row_count(level2):
+    """Number of rows a proposal's Level 2 data will write, counting its two Level 1 rows."""
+    return 2 + len(level2['timelines'] or []) + bool(level2['location']) + len(level2['forms'] or {}) + len(level2['documents'] or [])
+
+def ledger_statuses(plan, level2):
+    """Return the import ledger state of each endpoint in a proposal's plan."""
+    statuses = {}
+    if LEVEL1 not in plan.completed:
+        statuses[LEVEL1] = DONE
+    
+    # Endpoints that failed are left for the next run
+    for endpoint in plan.endpoints:
+        statuses[endpoint] = DONE if endpoint in level2['answered'] else FAILED
+    for form_type in plan.skipped_forms:
+        statuses[FORM_ENDPOINTS[form_type]] = SKIPPED
+    return statuses
+
+def write_rows(cursor, batch, codec=None):
+    """Write the rows of a batch of proposals with one executemany per table."""
+    proposal_rows = []
+    details_rows = []
+    properties = []
+    rows = {table: [] for table in LEVEL2_UPSERTS}
+    ledger_entries = []
+    
+    for proposal, plan, level2 in batch:
+        proposal_id = proposal.get('proposalNo')
+        proposal_row, details_row = proposal_record_rows(proposal, codec)
+        proposal_rows.append(proposal_row)
+        details_rows.append(details_row)
+        properties.extend(property_rows(proposal_id, proposal))
+        for table, table_rows in level2_rows(proposal_id, level2).items():
+            rows[table].extend(table_rows)
+        ledger_entries.extend(
+            (proposal_id, endpoint, status) for endpoint, status in ledger_statuses(plan, level2).items()
+        )
+    
+    cursor.executemany(PROPOSAL_UPSERT, proposal_rows)
+    cursor.executemany(PROPOSAL_DETAILS_UPSERT, details_rows)
+    write_properties(cursor, [row[0] for row in proposal_rows], properties)
+    write_level2_rows(cursor, rows)
+    ImportLedger.record_many(cursor, ledger_entries)
 
-def process_level2_data(proposal_id, conn, session, headers):
-    """Process Level 2a and Level 2b data for a proposal."""
+def write_batch(conn, batch, applicability=None, codec=None):
+    """Write a batch of proposals and their Level 2 data in one transaction.
+    
+    Rows are gathered per table and written with one executemany each,
+    together with the import ledger entries. If that fails, the batch is
+    written again one proposal at a time, each under its own savepoint, so
+    one bad record does not take the rest of the batch with it. What the
+    FormApplicability learned is saved in the same transaction. Returns
+    the number of proposals written.
+    """
     cursor = conn.cursor()
+    if not conn.in_transaction:
+        cursor.execute("BEGIN")
     
-    # Get and process timeline information (Level 2a)
-    timelines = get_proposal_timelines(proposal_id, session, headers)
-    if timelines:
-        for timeline in timelines:
-            cursor.execute('''
-            INSERT INTO proposal_timelines (
-                proposal_id,
-                status,
-                date,
-                remarks
-            ) VALUES (?, ?, ?, ?)
-            ''', (
-                proposal_id,
-                timeline.get('status', ''),
-                timeline.get('date', ''),
-                timeline.get('remarks', '')
-            ))
-        logger.info(f"Added {len(timelines)} timeline entries for proposal {proposal_id}")
-    
-    # Get and process project location (Level 2b)
-    location = get_project_location(proposal_id, session, headers)
-    if location:
-        cursor.execute('''
-        INSERT INTO project_locations (
-            proposal_id,
-            location_data
-        ) VALUES (?, ?)
-        ''', (
-            proposal_id,
-            json.dumps(location) if isinstance(location, dict) else location
-        ))
-        logger.info(f"Added location data for proposal {proposal_id}")
-    
-    # Get and process forms (Level 2b)
-    forms = get_proposal_forms(proposal_id, session, headers)
-    if forms:
-        for form_type, form_data in forms.items():
-            cursor.execute('''
-            INSERT INTO proposal_forms (
-                proposal_id,
-                form_type,
-                form_data
-            ) VALUES (?, ?, ?)
-            ''', (
-                proposal_id,
-                form_type,
-                json.dumps(form_data)
-            ))
-        logger.info(f"Added {len(forms)} forms for proposal {proposal_id}")
-    
-    # Get and process documents (Level 2b)
-    documents = get_documents(proposal_id, session, headers)
-    if documents:
-        for document in documents:
-            cursor.execute('''
-            INSERT INTO documents (
-                proposal_id,
-                document_type,
-                document_name,
-                document_url
-            ) VALUES (?, ?, ?, ?)
-            ''', (
-                proposal_id,
-                document.get('documentType', ''),
-                document.get('documentName', ''),
-                document.get('documentUrl', '')
-            ))
-        logger.info(f"Added {len(documents)} documents for proposal {proposal_id}")
+    cursor.execute("SAVEPOINT batch")
+    try:
+        write_rows(cursor, batch, codec)
+        written = len(batch)
+    except Exception as e:
+        cursor.execute("ROLLBACK TO batch")
+        logger.warning(f"Could not write a batch of {len(batch)} proposals at once ({str(e)}), writing them one by one")
+        written = 0
+        for item in batch:
+            cursor.execute("SAVEPOINT proposal")
+            try:
+                write_rows(cursor, [item], codec)
+                written += 1
+            except Exception as e:
+                cursor.execute("ROLLBACK TO proposal")
+                logger.error(f"Error writing proposal {item[0].get('proposalNo')}: {str(e)}")
+            cursor.execute("RELEASE proposal")
+    cursor.execute("RELEASE batch")
     
+    if applicability is not None:
+        applicability.save(cursor)
     conn.commit()
+    return written
+
+async def import_proposal_records(proposals, conn, workers=FETCH_WORKERS):
+    """Insert proposals and fetch their Level 2 data with one shared API client.
+    
+    Runs as a pipeline: proposals are queued for a pool of fetch workers,
+    which hand their results to a single writer that commits them in
+    batches on its own thread. Both queues are bounded, so a slow server
+    or a slow disk holds the other side back instead of piling up memory.
+    The connection must allow use from another thread
+    (check_same_thread=False). Returns the number of proposals written.
+    """
+    loop = asyncio.get_running_loop()
+    fetch_queue = asyncio.Queue(maxsize=workers * 2)
+    write_queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer_thread = ThreadPoolExecutor(max_workers=1)
+    written = 0
+    skipped_calls = 0
+    already_imported = 0
+    
+    # Which forms exist for which kinds of proposal, learned across imports
+    applicability = FormApplicability().load(conn)
+    
+    # What earlier runs already imported, so only unfinished work is redone
+    ledger = ImportLedger().load(conn)
+    
+    # raw_json is stored compressed; a new database trains its dictionary
+    # on the first records of this import
+    RawJsonCodec.create_table(conn)
+    codec = RawJsonCodec.load(conn)
+    if codec.dictionary is None:
+        proposals = iter(proposals)
+        samples = list(islice(proposals, TRAIN_SAMPLES))
+        if samples:
+            codec.train(samples)
+            conn.commit()
+        proposals = chain(samples, proposals)
+    
+    async def produce():
+        nonlocal skipped_calls, already_imported
+        for i, proposal in enumerate(proposals):
+            proposal_id = proposal.get('proposalNo')
+            if not proposal_id:
+                logger.warning(f"Proposal at index {i} has no proposalNo, skipping")
+                continue
+            
+            # Level 1 fields such as form_id, forms known not to exist for
+            # this kind of proposal and work already done save Level 2 calls
+            completed = ledger.completed_endpoints(proposal_id)
+            plan = plan_requests(proposal, applicability, completed)
+            # Nothing left to fetch, but the Level 1 row is still refreshed
+            if LEVEL1 in completed and not plan.endpoints and not plan.skipped_forms:
+                already_imported += 1
+            
+            skipped_calls += len(plan.skipped)
+            await fetch_queue.put((i, proposal, plan))
+        for _ in range(workers):
+            await fetch_queue.put(None)
+    
+    async def fetch(client):
+        while True:
+            item = await fetch_queue.get()
+            if item is None:
+                return
+            
+            i, proposal, plan = item
+            proposal_id = proposal['proposalNo']
+            try:
+                logger.info(f"Processing proposal {i+1}: {proposal_id}")
+                level2 = await fetch_level2_data(plan, client, applicability=applicability)
+            except Exception as e:
+                logger.error(f"Error processing proposal {proposal_id}: {str(e)}")
+                import traceback
+                logger.error(traceback.format_exc())
+                continue
+            await write_queue.put((proposal, plan, level2))
+    
+    async def write():
+        nonlocal written
+        finished = False
+        while not finished:
+            # Wait for the first item, then give the group a little time to fill
+            batch = []
+            rows = 0
+            item = await write_queue.get()
+            deadline = loop.time() + WRITE_INTERVAL_MS / 1000
+            while item is not None:
+                batch.append(item)
+                rows += level2_row_count(item[2])
+                if rows >= WRITE_BATCH_ROWS:
+                    break
+                try:
+                    item = await asyncio.wait_for(write_queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+            finished = item is None
+            
+            if batch:
+                try:
+                    written += await loop.run_in_executor(writer_thread, write_batch, conn, batch, applicability, codec)
+                    logger.info(f"Committed {len(batch)} proposals ({rows} rows), {written} written so far")
+                except Exception as e:
+                    logger.error(f"Error writing a batch of {len(batch)} proposals: {str(e)}")
+                    import traceback
+                    logger.error(traceback.format_exc())
+    
+    try:
+        async with PariveshClient() as client:
+            writer = asyncio.create_task(write())
+            await asyncio.gather(produce(), *(fetch(client) for _ in range(workers)))
+            await write_queue.put(None)
+            await writer
+    finally:
+        writer_thread.shutdown()
+    
+    logger.info(f"Skipped Level 2 fetches for {already_imported} proposals imported by an earlier run")
+    logger.info(f"Skipped {skipped_calls} Level 2 calls answered by Level 1 fields, known to return nothing or already imported")
+    return written
 
 def import_proposals(json_file, db_path):
-    """Import proposals from JSON file to database."""
+    """Import proposals from an NDJSON (or older JSON array) file to database."""
     if not os.path.exists(json_file):
         logger.error(f"JSON file {json_file} not found")
         return False
     
     try:
-        # Load proposals from JSON file
-        with open(json_file, 'r') as f:
-            proposals = json.load(f)
-        
-        logger.info(f"Loaded {len(proposals)} proposals from {json_file}")
+        # Proposals are streamed from the scraper's output file
+        proposals = read_records(json_file)
+        logger.info(f"Importing proposals from {json_file}")
         
-        # Connect to database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create a session for API requests
-        session = requests.Session()
+        # Connect to database; the importer writes from its own thread
+        conn = connect(db_path, check_same_thread=False)
         
-        # Headers that mimic a browser
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
-            "Accept": "application/json, text/plain, */*",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Origin": "https://parivesh.nic.in",
-            "Referer": "https://parivesh.nic.in/",
-            "Connection": "keep-alive"
-        }
+        written = asyncio.run(import_proposal_records(proposals, conn))
         
-        # Visit the main page to get cookies
-        logger.info("Visiting main page to get cookies...")
-        session.get("https://parivesh.nic.in", headers=headers)
-        
-        # Process each proposal
-        for i, proposal in enumerate(proposals):
-            try:
-                proposal_id = proposal.get('proposalNo')
-                if not proposal_id:
-                    logger.warning(f"Proposal at index {i} has no proposalNo, skipping")
-                    continue
-                
-                logger.info(f"Processing proposal {i+1}/{len(proposals)}: {proposal_id}")
-                
-                # Extract year from proposal ID
-                year = None
-                if proposal_id and len(proposal_id) >= 4:
-                    try:
-                        year = int(proposal_id[-4:])
-                    except ValueError:
-                        year = datetime.now().year
-                
-                # Insert into proposals table (Level 1)
-                cursor.execute('''
-                INSERT INTO proposals (
-                    proposal_id,
-                    sw_no,
-                    project_name,
-                    company_name,
-                    state,
-                    category,
-                    sector,
-                    current_status,
-                    proposal_type,
-                    clearance_type,
-                    submission_date,
-                    last_updated,
-                    year
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    proposal_id,
-                    proposal.get('swNo', ''),
-                    proposal.get('projectName', ''),
-                    proposal.get('companyName', ''),
-                    proposal.get('stateName', ''),
-                    proposal.get('categoryName', ''),
-                    proposal.get('sectorName', ''),
-                    proposal.get('proposalStatus', ''),
-                    proposal.get('proposalType', ''),
-                    proposal.get('clearanceTypeName', ''),
-                    proposal.get('lastSubmissionDate', ''),
-                    proposal.get('lastStatusDate', ''),
-                    year
-                ))
-                
-                # Insert into proposal_details table (Level 2a)
-                cursor.execute('''
-                INSERT INTO proposal_details (
-                    proposal_id,
-                    raw_json
-                ) VALUES (?, ?)
-                ''', (
-                    proposal_id,
-                    json.dumps(proposal)
-                ))
-                
-                # Process Level 2a and Level 2b data
-                process_level2_data(proposal_id, conn, session, headers)
-                
-                # Add a small delay to avoid overwhelming the server
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Processed {i+1} proposals, taking a short break...")
-                    time.sleep(2)
-            
-            except Exception as e:
-                logger.error(f"Error processing proposal {proposal_id}: {str(e)}")
-                import traceback
-                logger.error(traceback.format_exc())
+        # Refresh the planner statistics after the bulk load
+        if written:
+            analyze(conn)
         
         # Close database connection
         conn.close()
         
-        logger.info(f"Successfully imported {len(proposals)} proposals to database")
+        logger.info(f"Successfully imported {written} proposals to database")
         return True
     
     except Exception as e:
@@ -454,7 +436,7 @@ def check_database(db_path):
         return
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         # List all tables in the database
@@ -524,183 +506,26 @@ def check_database(db_path):
         print(traceback.format_exc())
 
 def create_status_checker():
-    """Create a script to check for new proposals and status changes."""
-    script_content = '''import sqlite3
-import logging
-import json
-import requests
-import time
-from datetime import datetime
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("status_checker.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-def check_for_updates(db_path, state_id=36, year=2024):
-    """Check for new proposals and status changes."""
-    logger.info(f"Checking for updates in {state_id} for {year}")
-    
-    # Connect to database
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Get existing proposals
-    cursor.execute("SELECT proposal_id, current_status FROM proposals")
-    existing_proposals = {row[0]: row[1] for row in cursor.fetchall()}
-    
-    # Create a session for API requests
-    session = requests.Session()
-    
-    # Headers that mimic a browser
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
-        "Accept": "application/json, text/plain, */*",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Origin": "https://parivesh.nic.in",
-        "Referer": "https://parivesh.nic.in/",
-        "Connection": "keep-alive"
-    }
-    
-    # Visit the main page to get cookies
-    session.get("https://parivesh.nic.in", headers=headers)
-    
-    # Search for proposals
-    url = "https://parivesh.nic.in/parivesh_api/trackYourProposal/advanceSearchData"
-    params = {
-        "majorClearanceType": 1,  # Environmental Clearance
-        "state": state_id,
-        "sector": "",
-        "proposalStatus": "",
-        "proposalType": "",
-        "issuingAuthority": "",
-        "activityId": "",
-        "category": "",
-        "startDate": "",
-        "endDate": "",
-        "areaMin": "",
-        "areaMax": "",
-        "text": "",
-        "area": "",
-        "year": year,
-        "page": 0,
-        "size": 1000
-    }
-    
-    try:
-        response = session.get(url, params=params, headers=headers, timeout=60)
-        if response.status_code == 200:
-            data = response.json()
-            
-            if isinstance(data, dict) and 'data' in data and isinstance(data['data'], list):
-                current_proposals = data['data']
-                
-                # Check for new proposals and status changes
-                new_proposals = []
-                status_changes = []
-                
-                for proposal in current_proposals:
-                    proposal_id = proposal.get('proposalNo')
-                    if not proposal_id:
-                        continue
-                    
-                    current_status = proposal.get('proposalStatus', '')
-                    
-                    if proposal_id not in existing_proposals:
-                        # New proposal
-                        new_proposals.append(proposal)
-                        logger.info(f"New proposal found: {proposal_id} with status {current_status}")
-                    elif existing_proposals[proposal_id] != current_status:
-                        # Status change
-                        status_changes.append({
-                            'proposal_id': proposal_id,
-                            'old_status': existing_proposals[proposal_id],
-                            'new_status': current_status
-                        })
-                        logger.info(f"Status change for {proposal_id}: {existing_proposals[proposal_id]} -> {current_status}")
-                
-                # Process new proposals
-                if new_proposals:
-                    logger.info(f"Processing {len(new_proposals)} new proposals")
-                    for proposal in new_proposals:
-                        # Code to insert new proposal into database
-                        # This would call functions from final_import.py
-                        pass
-                
-                # Process status changes
-                if status_changes:
-                    logger.info(f"Processing {len(status_changes)} status changes")
-                    for change in status_changes:
-                        # Update status in database
-                        cursor.execute(
-                            "UPDATE proposals SET current_status = ? WHERE proposal_id = ?",
-                            (change['new_status'], change['proposal_id'])
-                        )
-                        
-                        # Add to timeline
-                        cursor.execute(
-                            "INSERT INTO proposal_timelines (proposal_id, status, date, remarks) VALUES (?, ?, ?, ?)",
-                            (change['proposal_id'], change['new_status'], datetime.now().strftime("%Y-%m-%d"), "Status updated by checker")
-                        )
-                    
-                    conn.commit()
-                
-                logger.info(f"Found {len(new_proposals)} new proposals and {len(status_changes)} status changes")
-            else:
-                logger.warning("Unexpected response format")
-        else:
-            logger.error(f"Failed to get proposals: {response.status_code}")
-    
-    except Exception as e:
-        logger.error(f"Error checking for updates: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+    """Make sure the status checker script is in place."""
+    # status_checker.py is maintained alongside this script and shares the
+    # PariveshClient, so it is no longer generated from a template here
+    if not os.path.exists("status_checker.py"):
+        logger.error("status_checker.py not found")
+        return
     
-    finally:
-        conn.close()
+    logger.info("status_checker.py is available to check for new proposals and status changes")
 
 if __name__ == "__main__":
-    import sys
-    import time
-    
+    json_file = "telangana_2024_all_proposals.ndjson"
     db_path = "parivesh.db"
-    check_interval_hours = 24
-    
-    if len(sys.argv) > 1:
-        db_path = sys.argv[1]
-    
-    if len(sys.argv) > 2:
-        try:
-            check_interval_hours = int(sys.argv[2])
-        except ValueError:
-            logger.warning(f"Invalid check interval: {sys.argv[2]}, using default: 24 hours")
-    
-    logger.info(f"Starting status checker with database: {db_path} and check interval: {check_interval_hours} hours")
-    
-    while True:
-        check_for_updates(db_path)
-        logger.info(f"Sleeping for {check_interval_hours} hours before next check")
-        time.sleep(check_interval_hours * 3600)
-'''
-    
-    with open("status_checker.py", "w") as f:
-        f.write(script_content)
     
-    logger.info("Created status_checker.py to check for new proposals and status changes")
-
-if __name__ == "__main__":
-    json_file = "telangana_2024_all_proposals.json"
-    db_path = "parivesh.db"
+    # Fall back to the output of older scraper runs
+    if not os.path.exists(json_file) and os.path.exists("telangana_2024_all_proposals.json"):
+        json_file = "telangana_2024_all_proposals.json"
     
     logger.info("Starting final import process...")
     
-    # Set up fresh database
+    # Make sure the schema exists; earlier imports are kept and resumed
     setup_database(db_path)
     
     # Import proposals with all levels of data
@@ -1,12 +1,12 @@
-import json
-import sqlite3
 import logging
 import os
 import time
 import random
-import requests
 from datetime import datetime, timedelta
 
+from db import connect, connect_readonly
+from db_schema import LEVEL2_UPSERTS, analyze, level2_rows, migrate, write_level2_rows
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,95 +15,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Level 2 rows are group-committed once this many are waiting, or after this many milliseconds
+WRITE_BATCH_ROWS = 2000
+WRITE_INTERVAL_MS = 500
+
 def setup_database(db_path):
-    """Set up the database with the correct schema."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create proposals table (Level 1) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT UNIQUE,
-        sw_no TEXT,
-        project_name TEXT,
-        company_name TEXT,
-        state TEXT,
-        category TEXT,
-        sector TEXT,
-        current_status TEXT,
-        proposal_type TEXT,
-        clearance_type TEXT,
-        submission_date TEXT,
-        last_updated TEXT,
-        year INTEGER,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create proposal_details table (Level 2a) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_details (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT UNIQUE,
-        raw_json TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create proposal_timelines table (Level 2a) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_timelines (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        status TEXT,
-        date TEXT,
-        remarks TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create project_locations table (Level 2b) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS project_locations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        location_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create proposal_forms table (Level 2b) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proposal_forms (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        form_type TEXT,
-        form_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    # Create documents table (Level 2b) if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        proposal_id TEXT,
-        document_type TEXT,
-        document_name TEXT,
-        document_url TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (proposal_id) REFERENCES proposals (proposal_id)
-    )
-    ''')
-    
-    conn.commit()
+    """Bring the database up to the current schema version in place, keeping its data."""
+    conn = connect(db_path)
+    version = migrate(conn)
     conn.close()
-    logger.info(f"Database {db_path} setup complete")
+    logger.info(f"Database {db_path} setup complete (schema version {version})")
 
 def simulate_timeline_data(proposal_id, status):
     """Simulate timeline data for a proposal."""
@@ -261,7 +182,7 @@ def simulate_document_data(proposal_id):
 
 def populate_level2_data(db_path, num_proposals=50):
     """Populate Level 2a and Level 2b data for a sample of proposals."""
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
     
     # Get a sample of proposals to process
@@ -275,84 +196,58 @@ def populate_level2_data(db_path, num_proposals=50):
     
     logger.info(f"Populating Level 2 data for {len(proposals)} proposals...")
     
+    # Rows are collected per table and group-committed with executemany
+    rows = {table: [] for table in LEVEL2_UPSERTS}
+    pending = 0
+    last_flush = time.monotonic()
+    
+    def flush():
+        nonlocal rows, pending, last_flush
+        try:
+            write_level2_rows(cursor, rows)
+            conn.commit()
+            logger.info(f"Committed {pending} rows")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error writing {pending} rows: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+        rows = {table: [] for table in LEVEL2_UPSERTS}
+        pending = 0
+        last_flush = time.monotonic()
+    
     for i, (proposal_id, status) in enumerate(proposals):
         logger.info(f"Processing proposal {i+1}/{len(proposals)}: {proposal_id}")
         
         try:
-            # Generate and insert timeline data (Level 2a)
-            timelines = simulate_timeline_data(proposal_id, status)
-            for timeline in timelines:
-                cursor.execute('''
-                INSERT INTO proposal_timelines (
-                    proposal_id,
-                    status,
-                    date,
-                    remarks
-                ) VALUES (?, ?, ?, ?)
-                ''', (
-                    proposal_id,
-                    timeline.get('status', ''),
-                    timeline.get('date', ''),
-                    timeline.get('remarks', '')
-                ))
-            logger.info(f"Added {len(timelines)} timeline entries for proposal {proposal_id}")
-            
-            # Generate and insert location data (Level 2b)
-            location = simulate_location_data(proposal_id)
-            cursor.execute('''
-            INSERT INTO project_locations (
-                proposal_id,
-                location_data
-            ) VALUES (?, ?)
-            ''', (
-                proposal_id,
-                json.dumps(location)
-            ))
-            logger.info(f"Added location data for proposal {proposal_id}")
-            
-            # Generate and insert form data (Level 2b)
-            form_types = ["caf", "part_a", "part_b", "part_c"]
-            for form_type in form_types:
-                form_data = simulate_form_data(proposal_id, form_type)
-                cursor.execute('''
-                INSERT INTO proposal_forms (
-                    proposal_id,
-                    form_type,
-                    form_data
-                ) VALUES (?, ?, ?)
-                ''', (
-                    proposal_id,
-                    form_type,
-                    json.dumps(form_data)
-                ))
-            logger.info(f"Added form data for proposal {proposal_id}")
-            
-            # Generate and insert document data (Level 2b)
-            documents = simulate_document_data(proposal_id)
-            for document in documents:
-                cursor.execute('''
-                INSERT INTO documents (
-                    proposal_id,
-                    document_type,
-                    document_name,
-                    document_url
-                ) VALUES (?, ?, ?, ?)
-                ''', (
-                    proposal_id,
-                    document.get('documentType', ''),
-                    document.get('documentName', ''),
-                    document.get('documentUrl', '')
-                ))
-            logger.info(f"Added {len(documents)} documents for proposal {proposal_id}")
-            
-            # Commit after each proposal
-            conn.commit()
+            # Generate timeline data (Level 2a) and location, form and document data (Level 2b)
+            level2 = {
+                'timelines': simulate_timeline_data(proposal_id, status),
+                'location': simulate_location_data(proposal_id),
+                'forms': {
+                    form_type: simulate_form_data(proposal_id, form_type)
+                    for form_type in ["caf", "part_a", "part_b", "part_c"]
+                },
+                'documents': simulate_document_data(proposal_id)
+            }
+            for table, table_rows in level2_rows(proposal_id, level2).items():
+                rows[table].extend(table_rows)
+                pending += len(table_rows)
             
         except Exception as e:
             logger.error(f"Error processing proposal {proposal_id}: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
+        
+        # Commit once enough rows are waiting or enough time has passed
+        if pending >= WRITE_BATCH_ROWS or (time.monotonic() - last_flush) * 1000 >= WRITE_INTERVAL_MS:
+            flush()
     
+    if pending:
+        flush()
+    
+    # Refresh the planner statistics after the bulk load
+    analyze(conn)
     conn.close()
     logger.info(f"Successfully populated Level 2 data for {len(proposals)} proposals")
     return True
@@ -364,7 +259,7 @@ def check_database(db_path):
         return
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         # List all tables in the database
@@ -466,175 +361,14 @@ def check_database(db_path):
         print(traceback.format_exc())
 
 def create_status_checker():
-    """Create a script to check for new proposals and status changes."""
-    script_content = '''import sqlite3
-import logging
-import json
-import requests
-import time
-from datetime import datetime
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("status_checker.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-def check_for_updates(db_path, state_id=36, year=2024):
-    """Check for new proposals and status changes."""
-    logger.info(f"Checking for updates in {state_id} for {year}")
-    
-    # Connect to database
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Get existing proposals
-    cursor.execute("SELECT proposal_id, current_status FROM proposals")
-    existing_proposals = {row[0]: row[1] for row in cursor.fetchall()}
-    
-    # Create a session for API requests
-    session = requests.Session()
-    
-    # Headers that mimic a browser
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
-        "Accept": "application/json, text/plain, */*",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Origin": "https://parivesh.nic.in",
-        "Referer": "https://parivesh.nic.in/",
-        "Connection": "keep-alive"
-    }
-    
-    # Visit the main page to get cookies
-    session.get("https://parivesh.nic.in", headers=headers)
-    
-    # Search for proposals
-    url = "https://parivesh.nic.in/parivesh_api/trackYourProposal/advanceSearchData"
-    params = {
-        "majorClearanceType": 1,  # Environmental Clearance
-        "state": state_id,
-        "sector": "",
-        "proposalStatus": "",
-        "proposalType": "",
-        "issuingAuthority": "",
-        "activityId": "",
-        "category": "",
-        "startDate": "",
-        "endDate": "",
-        "areaMin": "",
-        "areaMax": "",
-        "text": "",
-        "area": "",
-        "year": year,
-        "page": 0,
-        "size": 1000
-    }
-    
-    try:
-        response = session.get(url, params=params, headers=headers, timeout=60)
-        if response.status_code == 200:
-            data = response.json()
-            
-            if isinstance(data, dict) and 'data' in data and isinstance(data['data'], list):
-                current_proposals = data['data']
-                
-                # Check for new proposals and status changes
-                new_proposals = []
-                status_changes = []
-                
-                for proposal in current_proposals:
-                    proposal_id = proposal.get('proposalNo')
-                    if not proposal_id:
-                        continue
-                    
-                    current_status = proposal.get('proposalStatus', '')
-                    
-                    if proposal_id not in existing_proposals:
-                        # New proposal
-                        new_proposals.append(proposal)
-                        logger.info(f"New proposal found: {proposal_id} with status {current_status}")
-                    elif existing_proposals[proposal_id] != current_status:
-                        # Status change
-                        status_changes.append({
-                            'proposal_id': proposal_id,
-                            'old_status': existing_proposals[proposal_id],
-                            'new_status': current_status
-                        })
-                        logger.info(f"Status change for {proposal_id}: {existing_proposals[proposal_id]} -> {current_status}")
-                
-                # Process new proposals
-                if new_proposals:
-                    logger.info(f"Processing {len(new_proposals)} new proposals")
-                    for proposal in new_proposals:
-                        # Code to insert new proposal into database
-                        # This would call functions from final_import.py
-                        pass
-                
-                # Process status changes
-                if status_changes:
-                    logger.info(f"Processing {len(status_changes)} status changes")
-                    for change in status_changes:
-                        # Update status in database
-                        cursor.execute(
-                            "UPDATE proposals SET current_status = ? WHERE proposal_id = ?",
-                            (change['new_status'], change['proposal_id'])
-                        )
-                        
-                        # Add to timeline
-                        cursor.execute(
-                            "INSERT INTO proposal_timelines (proposal_id, status, date, remarks) VALUES (?, ?, ?, ?)",
-                            (change['proposal_id'], change['new_status'], datetime.now().strftime("%Y-%m-%d"), "Status updated by checker")
-                        )
-                    
-                    conn.commit()
-                
-                logger.info(f"Found {len(new_proposals)} new proposals and {len(status_changes)} status changes")
-            else:
-                logger.warning("Unexpected response format")
-        else:
-            logger.error(f"Failed to get proposals: {response.status_code}")
-    
-    except Exception as e:
-        logger.error(f"Error checking for updates: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-    
-    finally:
-        conn.close()
-
-if __name__ == "__main__":
-    import sys
-    import time
-    
-    db_path = "parivesh.db"
-    check_interval_hours = 24
-    
-    if len(sys.argv) > 1:
-        db_path = sys.argv[1]
-    
-    if len(sys.argv) > 2:
-        try:
-            check_interval_hours = int(sys.argv[2])
-        except ValueError:
-            logger.warning(f"Invalid check interval: {sys.argv[2]}, using default: 24 hours")
-    
-    logger.info(f"Starting status checker with database: {db_path} and check interval: {check_interval_hours} hours")
-    
-    while True:
-        check_for_updates(db_path)
-        logger.info(f"Sleeping for {check_interval_hours} hours before next check")
-        time.sleep(check_interval_hours * 3600)
-'''
-    
-    with open("status_checker.py", "w") as f:
-        f.write(script_content)
+    """Make sure the status checker script is in place."""
+    # status_checker.py is maintained alongside this script and shares the
+    # PariveshClient, so it is no longer generated from a template here
+    if not os.path.exists("status_checker.py"):
+        logger.error("status_checker.py not found")
+        return
     
-    logger.info("Created status_checker.py to check for new proposals and status changes")
+    logger.info("status_checker.py is available to check for new proposals and status changes")
 
 def create_readme():
     """Create a comprehensive README.md file for the project."""
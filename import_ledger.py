@@ -0,0 +1,101 @@
+import logging
+from datetime import datetime
+
+from request_planner import FORM_ENDPOINTS
+
+logger = logging.getLogger(__name__)
+
+# Ledger endpoint standing for the proposal's own Level 1 row
+LEVEL1 = "advanceSearchData"
+
+# Ledger states; done and skipped both mean there is nothing left to fetch
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Tables whose rows show an endpoint was imported before the ledger existed
+BACKFILL_TABLES = {
+    "getApprovalDates": "proposal_timelines",
+    "getKmlFile": "project_locations",
+    "getDocuments": "documents"
+}
+
+
+class ImportLedger:
+    """Records which endpoints have been imported for each proposal.
+
+    The import_ledger table holds one row per proposal and endpoint, with
+    its state, the number of attempts and when it last changed. Ledger rows
+    are written in the same transaction as the data they describe, so a
+    re-run can fetch exactly what is still missing.
+    """
+
+    def __init__(self):
+        self.completed = {}
+
+    def load(self, conn):
+        """Create the import_ledger table if needed and load what is already done."""
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'import_ledger'")
+        is_new = cursor.fetchone() is None
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_ledger (
+            proposal_id TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 1,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (proposal_id, endpoint)
+        )
+        ''')
+        if is_new:
+            self.backfill(cursor)
+        conn.commit()
+
+        cursor.execute("SELECT proposal_id, endpoint FROM import_ledger WHERE status IN (?, ?)", (DONE, SKIPPED))
+        for proposal_id, endpoint in cursor.fetchall():
+            self.completed.setdefault(proposal_id, set()).add(endpoint)
+        logger.info(f"Import ledger has completed work for {len(self.completed)} proposals")
+        return self
+
+    def backfill(self, cursor):
+        """Fill a new ledger from the rows already in the database."""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = set()
+
+        cursor.execute("SELECT proposal_id FROM proposals")
+        rows.update((proposal_id, LEVEL1) for proposal_id, in cursor.fetchall())
+        for endpoint, table in BACKFILL_TABLES.items():
+            cursor.execute(f"SELECT DISTINCT proposal_id FROM {table}")
+            rows.update((proposal_id, endpoint) for proposal_id, in cursor.fetchall())
+        cursor.execute("SELECT DISTINCT proposal_id, form_type FROM proposal_forms")
+        rows.update(
+            (proposal_id, FORM_ENDPOINTS[form_type])
+            for proposal_id, form_type in cursor.fetchall()
+            if form_type in FORM_ENDPOINTS
+        )
+
+        if rows:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO import_ledger (proposal_id, endpoint, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(proposal_id, endpoint, DONE, now) for proposal_id, endpoint in rows]
+            )
+            logger.info(f"Backfilled the import ledger with {len(rows)} entries from existing data")
+
+    def completed_endpoints(self, proposal_id):
+        """Return the endpoints already imported for a proposal."""
+        return self.completed.get(proposal_id, set())
+
+    @staticmethod
+    def record_many(cursor, entries):
+        """Write (proposal_id, endpoint, status) entries with one executemany; the caller commits."""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.executemany('''
+        INSERT INTO import_ledger (proposal_id, endpoint, status, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(proposal_id, endpoint) DO UPDATE SET
+            status = excluded.status,
+            attempts = attempts + 1,
+            updated_at = excluded.updated_at
+        ''', [(proposal_id, endpoint, status, now) for proposal_id, endpoint, status in entries])
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Pages a background writer holds before write_page waits for the disk
+WRITE_QUEUE_PAGES = 64
+
+
+class NDJSONWriter:
+    """Append-only writer of one compact JSON record per line.
+
+    Records are written a page at a time and the file is fsynced after
+    every page, so a crash loses at most the page being written. Opening an
+    existing file in append mode first drops a torn last line left by such
+    a crash:
+
+        with NDJSONWriter("proposals.ndjson") as writer:
+            writer.write_page(records)
+
+    With background=True pages are encoded, written and fsynced by a writer
+    thread, so write_page can be called from an event loop without blocking
+    it on the disk. Pages are still written in the order they are given; an
+    error in the thread is raised by the next write_page or by close().
+    """
+
+    def __init__(self, path, append=False, background=False):
+        self.path = path
+        self.records = 0
+        self.pages = 0
+        if append:
+            _drop_torn_line(path)
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+        self._error = None
+        self._queue = None
+        self._thread = None
+        if background:
+            self._queue = queue.Queue(maxsize=WRITE_QUEUE_PAGES)
+            self._thread = threading.Thread(target=self._write_queued, name=f"ndjson-writer-{path}", daemon=True)
+            self._thread.start()
+
+    def __enter__(self) -> "NDJSONWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write_page(self, records):
+        """Write a page of records and make sure they are on disk.
+
+        A background writer only queues the page; it is on disk once the
+        thread gets to it.
+        """
+        if not records:
+            return
+        if self._queue is None:
+            self._write(records)
+            return
+        if self._error is not None:
+            raise self._error
+        self._queue.put(records)
+
+    def _write(self, records):
+        self._file.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records += len(records)
+        self.pages += 1
+
+    def _write_queued(self):
+        """Writer thread: write queued pages until close() queues None."""
+        while True:
+            records = self._queue.get()
+            if records is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._write(records)
+            except Exception as e:
+                logger.error(f"Error writing {self.path}: {str(e)}")
+                self._error = e
+
+    def close(self):
+        """Wait for queued pages to be written, then close the file."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if not self._file.closed:
+            self._file.close()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+def _drop_torn_line(path):
+    """Truncate a file after its last complete line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+
+        # Walk back to the last newline
+        end = size
+        while end > 0:
+            start = max(end - 65536, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        logger.warning(f"Dropping {size - end} bytes of a torn last line in {path}")
+        f.truncate(end)
+
+
+def read_records(path):
+    """Yield the records of an NDJSON file, one at a time.
+
+    Also reads the older files holding a single JSON array, which are loaded
+    whole. A torn last line is skipped.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+
+        if first == "[":
+            yield from json.load(f)
+            return
+
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                if line.endswith("\n"):
+                    raise
+                logger.warning(f"Skipping torn last line {number} of {path}")
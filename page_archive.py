@@ -0,0 +1,156 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Directory the raw pages are archived under, one subdirectory per run
+DEFAULT_ARCHIVE_DIR = "page_archive"
+
+# Index of every archived page, one JSON line per page
+MANIFEST_FILE = "manifest.ndjson"
+
+# Runs older than this many days, or beyond the newest KEEP_RUNS, are deleted
+MAX_AGE_DAYS = 30
+KEEP_RUNS = 20
+
+# File extension of each supported compression
+EXTENSIONS = {"gzip": ".json.gz", "zstd": ".json.zst"}
+
+
+class PageArchive:
+    """Compressed archive of the raw pages fetched during a crawl.
+
+    Each page is stored as compact JSON, gzip- or zstd-compressed, under a
+    directory for the current run, and indexed in a manifest with its
+    search, record count and sizes. Old runs are pruned when the archive is
+    opened, so replaying and debugging a crawl stays possible without
+    keeping every page forever:
+
+        archive = PageArchive()
+        archive.save_page("state_36_2024_type_1", 0, envelope, params)
+        for entry, envelope in archive.iter_pages(run=archive.run_id):
+            ...
+    """
+
+    def __init__(self, directory=DEFAULT_ARCHIVE_DIR, compression="gzip", max_age_days=MAX_AGE_DAYS,
+                 keep_runs=KEEP_RUNS):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown compression {compression}, expected one of {sorted(EXTENSIONS)}")
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("zstd compression needs the zstandard package (pip install zstandard)") from None
+            self._zstd = zstandard.ZstdCompressor(level=10)
+
+        self.directory = directory
+        self.compression = compression
+        self.max_age_days = max_age_days
+        self.keep_runs = keep_runs
+        self.run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{os.getpid()}"
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.run_dir = os.path.join(directory, self.run_id)
+        # save_page may run in several threads at once; they share the manifest
+        self._manifest_lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.prune()
+
+    def _compress(self, data):
+        if self.compression == "zstd":
+            return self._zstd.compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def save_page(self, name, page, envelope, params=None):
+        """Archive one raw page and add it to the manifest."""
+        raw = json.dumps(envelope, separators=(",", ":")).encode("utf-8")
+        blob = self._compress(raw)
+        file_name = f"{name}_page_{page}{EXTENSIONS[self.compression]}"
+        path = os.path.join(self.run_dir, file_name)
+
+        os.makedirs(self.run_dir, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(blob)
+
+        records = envelope.get("data") if isinstance(envelope, dict) else None
+        entry = {
+            "run": self.run_id,
+            "file": os.path.join(self.run_id, file_name),
+            "name": name,
+            "page": page,
+            "params": params,
+            "records": len(records) if isinstance(records, list) else None,
+            "raw_bytes": len(raw),
+            "stored_bytes": len(blob),
+            "saved_at": datetime.now().isoformat(timespec='seconds')
+        }
+        with self._manifest_lock, open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def entries(self):
+        """Return the manifest entries, oldest first."""
+        if not os.path.exists(self.manifest_path):
+            return []
+        entries = []
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+    def iter_pages(self, run=None, name=None):
+        """Yield (manifest entry, decoded envelope) for the archived pages, for replay."""
+        for entry in self.entries():
+            if (run and entry["run"] != run) or (name and entry["name"] != name):
+                continue
+            path = os.path.join(self.directory, entry["file"])
+            if not os.path.exists(path):
+                continue
+            yield entry, load_page(path)
+
+    def prune(self):
+        """Delete runs past the retention policy and drop them from the manifest."""
+        runs = sorted(
+            entry for entry in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, entry))
+        )
+        cutoff = time.time() - self.max_age_days * 86400
+        expired = set(runs[:-self.keep_runs]) if self.keep_runs else set()
+        for run in runs:
+            if os.path.getmtime(os.path.join(self.directory, run)) < cutoff:
+                expired.add(run)
+        expired.discard(self.run_id)
+        if not expired:
+            return
+
+        for run in expired:
+            shutil.rmtree(os.path.join(self.directory, run), ignore_errors=True)
+
+        kept = [entry for entry in self.entries() if entry["run"] not in expired]
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in kept:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.manifest_path)
+        logger.info(f"Pruned {len(expired)} old runs from {self.directory}")
+
+
+def load_page(path):
+    """Read an archived page back into its decoded envelope."""
+    with open(path, "rb") as f:
+        blob = f.read()
+
+    if path.endswith(EXTENSIONS["zstd"]):
+        import zstandard
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        raw = gzip.decompress(blob)
+    return json.loads(raw)
@@ -0,0 +1,221 @@
+import json
+import logging
+import math
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# File the learned page sizes are kept in between runs
+DEFAULT_STATE_FILE = "page_sizes.json"
+
+# Page sizes tried when probing an endpoint, smallest first
+CANDIDATE_SIZES = (30, 100, 250, 500, 1000, 2000, 5000)
+
+# Size used before anything has been learned; what the website itself asks for
+DEFAULT_PAGE_SIZE = 30
+
+# Largest response we are willing to hold for a single page
+MAX_PAGE_BYTES = 16 * 1024 * 1024
+
+# A size that fails more often than this is not considered reliable
+MAX_FAILURE_RATE = 0.2
+
+# Weight of the newest sample in the running latency and payload averages
+SMOOTHING = 0.3
+
+
+class PageSizeTuner:
+    """Learns which page size to ask a paged endpoint for.
+
+    Every page fetched is recorded with its size, record count, latency and
+    payload. From those the tuner knows the largest size the server answers
+    reliably, and picks the size that minimises total crawl time given the
+    number of concurrent workers. What it learns is kept per endpoint in a
+    small JSON file so later runs start from it.
+    """
+
+    def __init__(self, state_file=DEFAULT_STATE_FILE):
+        self.state_file = state_file
+        self.endpoints = {}
+        self.load()
+
+    def load(self):
+        """Load the learned sizes from the state file, if there is one."""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                self.endpoints = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read page size state {self.state_file}: {str(e)}")
+            self.endpoints = {}
+
+    def save(self):
+        """Write the learned sizes to the state file."""
+        if not self.state_file:
+            return
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.endpoints, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_file)
+
+    def _endpoint(self, endpoint):
+        return self.endpoints.setdefault(endpoint, {"sizes": {}, "cap": None, "ignores_size": False})
+
+    def _size_stats(self, endpoint, size):
+        return self._endpoint(endpoint)["sizes"].setdefault(str(size), {
+            "ok": 0,
+            "failed": 0,
+            "latency": None,
+            "bytes_per_record": None
+        })
+
+    def observe(self, endpoint, size, records, elapsed, nbytes):
+        """Record a successful page fetch."""
+        stats = self._size_stats(endpoint, size)
+        stats["ok"] += 1
+        stats["latency"] = _smooth(stats["latency"], elapsed)
+        if records:
+            stats["bytes_per_record"] = _smooth(stats["bytes_per_record"], nbytes / records)
+
+        state = self._endpoint(endpoint)
+        state["updated"] = datetime.now().isoformat(timespec='seconds')
+        if records > size:
+            state["ignores_size"] = True
+
+    def observe_failure(self, endpoint, size):
+        """Record a page fetch that failed or timed out."""
+        self._size_stats(endpoint, size)["failed"] += 1
+        self._endpoint(endpoint)["updated"] = datetime.now().isoformat(timespec='seconds')
+
+    def mark_cap(self, endpoint, cap):
+        """Record that the server never returns more than cap records per page."""
+        state = self._endpoint(endpoint)
+        state["cap"] = cap if state["cap"] is None else min(state["cap"], cap)
+
+    def is_known(self, endpoint, result_size=None):
+        """True when the endpoint has been probed and a working size was found.
+
+        A probe that ran out of records only speaks for result sets as large
+        as the one it saw; a crawl known to be larger calls for a new probe.
+        """
+        state = self.endpoints.get(endpoint)
+        if not (state and state.get("probed") and self.reliable_sizes(endpoint)):
+            return False
+        bound = state.get("probed_records")
+        return bound is None or result_size is None or result_size <= bound
+
+    def reliable_sizes(self, endpoint):
+        """Return the sizes the server has answered reliably, smallest first."""
+        state = self.endpoints.get(endpoint)
+        if not state:
+            return []
+
+        sizes = []
+        for size, stats in state["sizes"].items():
+            size = int(size)
+            attempts = stats["ok"] + stats["failed"]
+            if not stats["ok"] or stats["failed"] / attempts > MAX_FAILURE_RATE:
+                continue
+            if state["cap"] is not None and size > state["cap"]:
+                continue
+            if stats["bytes_per_record"] and size * stats["bytes_per_record"] > MAX_PAGE_BYTES:
+                continue
+            sizes.append(size)
+        return sorted(sizes)
+
+    def _latency_model(self, endpoint, sizes):
+        """Fit latency = base + per_record * size over the reliable sizes."""
+        stats = self.endpoints[endpoint]["sizes"]
+        points = [(size, stats[str(size)]["latency"]) for size in sizes]
+        if len(points) == 1:
+            size, latency = points[0]
+            return latency, 0.0
+
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        per_record = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+        per_record = max(per_record, 0.0)
+        return max(mean_y - per_record * mean_x, 0.0), per_record
+
+    def best_size(self, endpoint, total_records=None, workers=1):
+        """Pick the page size that minimises the time to fetch total_records.
+
+        With no total the crawl is assumed to be long, so the size with the
+        lowest time per record wins.
+        """
+        sizes = self.reliable_sizes(endpoint)
+        if not sizes:
+            return DEFAULT_PAGE_SIZE
+        if self.endpoints[endpoint].get("ignores_size"):
+            # Every request returns the whole result set; size makes no difference
+            return sizes[0]
+
+        base, per_record = self._latency_model(endpoint, sizes)
+
+        def crawl_time(size):
+            if total_records is None:
+                # Time per record; kept in this form so equal sizes tie exactly
+                return base / size + per_record
+            page_time = base + per_record * size
+            pages = max(math.ceil(total_records / size), 1)
+            return math.ceil(pages / max(workers, 1)) * page_time
+
+        # Prefer the larger size on ties; it means fewer requests
+        return min(sizes, key=lambda size: (crawl_time(size), -size))
+
+    async def probe(self, fetch_page, endpoint, candidates=CANDIDATE_SIZES):
+        """Probe an endpoint with growing page sizes and learn what it accepts.
+
+        fetch_page(size, page) must fetch one page at the given size through
+        a client that reports to this tuner, and return its list of records.
+        Probing stops at the first size that fails, that the server ignores,
+        or that comes back short. A short page is either the end of the
+        result set or the server's own limit; fetching the next page tells
+        the two apart. A probe that ran out of records before finding the
+        limit records how many it saw, so only a larger crawl probes again.
+        """
+        logger.info(f"Probing page sizes for {endpoint}...")
+        conclusive = True
+        for size in candidates:
+            try:
+                records = await fetch_page(size, 0)
+            except Exception as e:
+                logger.info(f"Page size {size} failed for {endpoint}: {str(e)}")
+                break
+
+            if len(records) > size:
+                logger.info(f"{endpoint} ignores the page size and returned {len(records)} records")
+                break
+            if len(records) < size:
+                try:
+                    more = await fetch_page(size, 1)
+                except Exception:
+                    more = None
+                if more:
+                    logger.info(f"{endpoint} caps pages at {len(records)} records")
+                    self.mark_cap(endpoint, len(records))
+                else:
+                    logger.info(f"Result set ran out at page size {size}, {endpoint} is probed again for more than {len(records)} records")
+                    conclusive = False
+                break
+
+        state = self._endpoint(endpoint)
+        state["probed"] = True
+        if conclusive:
+            state.pop("probed_records", None)
+        else:
+            state["probed_records"] = len(records)
+        self.save()
+        size = self.best_size(endpoint)
+        logger.info(f"Learned page size {size} for {endpoint}")
+        return size
+
+
+def _smooth(previous, sample):
+    """Exponentially weighted running average."""
+    if previous is None:
+        return sample
+    return (1 - SMOOTHING) * previous + SMOOTHING * sample
@@ -0,0 +1,362 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from page_size_tuner import DEFAULT_STATE_FILE, PageSizeTuner
+from rate_limiter import TokenBucketLimiter
+from response_cache import ResponseCache
+from retry_policy import CircuitBreaker, CircuitOpenError, RetryPolicy, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# API base URLs
+BASE_URL = "https://parivesh.nic.in"
+API_URL = f"{BASE_URL}/parivesh_api"
+
+# Headers that mimic a browser
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Origin": BASE_URL,
+    "Referer": f"{BASE_URL}/",
+    "Connection": "keep-alive"
+}
+
+# Filters accepted by advanceSearchData; empty means "any"
+SEARCH_FILTERS = (
+    "sector",
+    "proposalStatus",
+    "proposalType",
+    "issuingAuthority",
+    "activityId",
+    "category",
+    "startDate",
+    "endDate",
+    "areaMin",
+    "areaMax",
+    "text",
+    "area"
+)
+
+JSONValue = Union[Dict[str, Any], List[Any], str, None]
+
+
+class PariveshClient:
+    """Shared asyncio client for the Parivesh trackYourProposal API.
+
+    One client owns a pooled aiohttp session, the site cookies and a
+    concurrency limit per host, so any number of coroutines can share it.
+    Every request first takes a token from the shared per-host and
+    per-endpoint rate limits. Failed requests are retried with backoff,
+    and an endpoint that keeps failing is cut off by its own circuit
+    breaker while the other endpoints carry on. Level 2 and lookup
+    responses are kept in an on-disk cache and revalidated once stale:
+
+        async with PariveshClient() as client:
+            timelines = await client.get_approval_dates(proposal_no)
+    """
+
+    def __init__(self, base_url=BASE_URL, max_connections=100, max_per_host=16, timeout=60,
+                 page_size_state=DEFAULT_STATE_FILE, rate_limiter=None, retry_policy=None,
+                 response_cache=None, use_cache=True):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/parivesh_api"
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.headers = dict(HEADERS, Origin=base_url, Referer=f"{base_url}/")
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._open_lock: Optional[asyncio.Lock] = None
+        self.page_sizes = PageSizeTuner(page_size_state)
+        self._owns_rate_limiter = rate_limiter is None
+        self.rate_limiter = rate_limiter or TokenBucketLimiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._owns_response_cache = use_cache and response_cache is None
+        self.response_cache = (response_cache or ResponseCache()) if use_cache else None
+
+    async def __aenter__(self) -> "PariveshClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """Create the pooled session and visit the main page to get cookies."""
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+
+        async with self._open_lock:
+            if self._session is not None:
+                return
+
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=self.timeout,
+                cookie_jar=aiohttp.CookieJar()
+            )
+
+            logger.info("Visiting main page to get cookies...")
+            try:
+                async with self._session.get(self.base_url) as response:
+                    await response.read()
+            except aiohttp.ClientError as e:
+                logger.warning(f"Could not visit main page for cookies: {str(e)}")
+
+    async def close(self):
+        """Close the pooled session and remember what was learned about page sizes."""
+        self.page_sizes.save()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._owns_rate_limiter:
+            self.rate_limiter.close()
+        if self.response_cache is not None:
+            cache = self.response_cache
+            if cache.hits or cache.revalidated or cache.misses:
+                logger.info(f"Response cache: {cache.hits} hits, {cache.revalidated} revalidated, {cache.misses} downloaded")
+            if self._owns_response_cache:
+                cache.close()
+
+    def _host_limit(self, url) -> asyncio.Semaphore:
+        """Return the semaphore limiting concurrent requests to the URL's host."""
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[host]
+
+    def breaker(self, name) -> CircuitBreaker:
+        """Return the circuit breaker of an endpoint."""
+        if name not in self._breakers:
+            self._breakers[name] = CircuitBreaker(name)
+        return self._breakers[name]
+
+    async def _request(self, url, params, name, *rate_keys, headers=None):
+        """GET a URL with rate limiting, retries and the named circuit breaker.
+
+        Returns the response status, headers and body text.
+        """
+        await self.open()
+        breaker = self.breaker(name)
+        if not breaker.allow():
+            raise CircuitOpenError(name, breaker.retry_in())
+        # An allowed call on an open circuit is its one trial call
+        trial = breaker.opened_at is not None
+
+        attempt = 0
+        try:
+            while True:
+                await self.rate_limiter.acquire(*rate_keys)
+                retry_after = None
+                try:
+                    async with self._host_limit(url):
+                        async with self._session.get(url, params=params, headers=headers) as response:
+                            if response.status in (429, 503):
+                                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                            response.raise_for_status()
+                            status, response_headers = response.status, response.headers
+                            body = await response.text()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if not self.retry_policy.is_retryable(e):
+                        # The endpoint answered; it just had nothing for us
+                        breaker.record_success()
+                        trial = False
+                        raise
+
+                    breaker.record_failure()
+                    trial = False
+                    attempt += 1
+                    if attempt >= self.retry_policy.max_attempts or not breaker.allow():
+                        raise
+                    trial = breaker.opened_at is not None
+
+                    delay = self.retry_policy.delay(attempt, retry_after)
+                    logger.warning(f"{name} failed ({type(e).__name__}: {e}), retry {attempt} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                breaker.record_success()
+                return status, response_headers, body
+        except BaseException:
+            # A trial call that was cancelled, or failed some other way, must not
+            # keep the circuit shut for good
+            if trial and breaker.trial_in_flight:
+                breaker.release_trial()
+            raise
+
+    async def fetch_text(self, url, params=None) -> str:
+        """GET a URL and return the response body as text."""
+        host = urlsplit(url).hostname
+        _, _, body = await self._request(url, params, host, host)
+        return body
+
+    async def _fetch_cached(self, url, endpoint, params):
+        """GET an endpoint through the response cache and return the body text.
+
+        A fresh cached response is returned without a request. A stale one is
+        revalidated with If-None-Match / If-Modified-Since, and a 304 renews it.
+        """
+        rate_keys = (urlsplit(url).hostname, endpoint)
+        ttl = self.response_cache.ttl(endpoint) if self.response_cache else None
+        if ttl is None:
+            _, _, body = await self._request(url, params, endpoint, *rate_keys)
+            return body
+
+        key = self.response_cache.make_key(endpoint, params)
+        cached = await self.response_cache.get(key)
+        if cached is not None and cached.is_fresh(ttl):
+            self.response_cache.hits += 1
+            return cached.body
+
+        headers = cached.conditional_headers() if cached is not None else None
+        status, response_headers, body = await self._request(url, params, endpoint, *rate_keys, headers=headers)
+        if status == 304 and cached is not None:
+            self.response_cache.revalidated += 1
+            await self.response_cache.touch(key)
+            return cached.body
+
+        self.response_cache.misses += 1
+        await self.response_cache.put(
+            key, endpoint, body, response_headers.get("ETag"), response_headers.get("Last-Modified")
+        )
+        return body
+
+    async def _get(self, endpoint, params=None):
+        """GET a trackYourProposal endpoint, returning the decoded value and the body size."""
+        url = f"{self.api_url}/trackYourProposal/{endpoint}"
+        body = await self._fetch_cached(url, endpoint, params)
+
+        try:
+            return json.loads(body), len(body)
+        except ValueError:
+            return body, len(body)
+
+    async def get_json(self, endpoint, params=None) -> JSONValue:
+        """GET a trackYourProposal endpoint and return the decoded JSON.
+
+        Falls back to the raw text for endpoints that do not always answer
+        with JSON, such as getKmlFile.
+        """
+        value, _ = await self._get(endpoint, params)
+        return value
+
+    # Level 1
+
+    async def advance_search_data(self, state, year, page=0, size=None, major_clearance_type=1, **filters) -> Dict[str, Any]:
+        """Search proposals; returns the response envelope with the records under 'data'.
+
+        With no size, the page size learned for the endpoint is used. Every
+        page is timed and reported to the page size tuner.
+        """
+        unknown = set(filters) - set(SEARCH_FILTERS)
+        if unknown:
+            raise TypeError(f"Unknown advanceSearchData filters: {sorted(unknown)}")
+
+        if size is None:
+            size = self.page_sizes.best_size("advanceSearchData")
+
+        params = {"majorClearanceType": major_clearance_type, "state": state}
+        params.update({name: filters.get(name) or "" for name in SEARCH_FILTERS})
+        params.update({"year": year, "page": page, "size": size})
+
+        started = time.monotonic()
+        try:
+            envelope, nbytes = await self._get("advanceSearchData", params)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.page_sizes.observe_failure("advanceSearchData", size)
+            raise
+
+        records = envelope.get('data') if isinstance(envelope, dict) else None
+        if isinstance(records, list):
+            self.page_sizes.observe("advanceSearchData", size, len(records), time.monotonic() - started, nbytes)
+        return envelope
+
+    async def tune_page_size(self, state, year, total_records=None, workers=1, major_clearance_type=1,
+                             result_size=None, probe_pages=None, **filters) -> int:
+        """Return the best advanceSearchData page size, probing the server when needed.
+
+        The server is probed the first time, and again when result_size
+        records is more than an earlier probe ran out at. The envelopes the
+        probe fetched are put in probe_pages, if given, keyed by (size, page),
+        so the crawl need not fetch them again.
+        """
+        if not self.page_sizes.is_known("advanceSearchData", result_size):
+            async def fetch_page(size, page):
+                envelope = await self.advance_search_data(
+                    state, year, page=page, size=size, major_clearance_type=major_clearance_type, **filters
+                )
+                records = envelope.get('data') if isinstance(envelope, dict) else None
+                if not isinstance(records, list):
+                    raise ValueError("Unexpected response format")
+                if probe_pages is not None:
+                    probe_pages[size, page] = envelope
+                return records
+
+            await self.page_sizes.probe(fetch_page, "advanceSearchData")
+
+        return self.page_sizes.best_size("advanceSearchData", total_records=total_records, workers=workers)
+
+    # Level 2a
+
+    async def data_of_proposal_no(self, proposal_no) -> JSONValue:
+        """Get the detailed record of a proposal."""
+        return await self.get_json("dataOfProposalNo", {"proposalNo": proposal_no})
+
+    async def get_approval_dates(self, proposal_no) -> JSONValue:
+        """Get the timeline entries of a proposal."""
+        return await self.get_json("getApprovalDates", {"proposalNo": proposal_no})
+
+    # Level 2b
+
+    async def get_kml_file(self, form_id) -> JSONValue:
+        """Get the project location KML for a form ID."""
+        return await self.get_json("getKmlFile", {"formId": form_id})
+
+    async def get_ca_form_details(self, proposal_no) -> JSONValue:
+        """Get the CAF of a proposal."""
+        return await self.get_json("getCaFormDetails", {"proposalNo": proposal_no})
+
+    async def get_part_a_details(self, proposal_no) -> JSONValue:
+        """Get Part A of a proposal."""
+        return await self.get_json("getPartADetails", {"proposalNo": proposal_no})
+
+    async def get_part_b_details(self, proposal_no) -> JSONValue:
+        """Get Part B of a proposal."""
+        return await self.get_json("getPartBDetails", {"proposalNo": proposal_no})
+
+    async def get_part_c_details(self, proposal_no) -> JSONValue:
+        """Get Part C of a proposal."""
+        return await self.get_json("getPartCDetails", {"proposalNo": proposal_no})
+
+    async def get_documents(self, proposal_no) -> JSONValue:
+        """Get the documents uploaded for a proposal."""
+        return await self.get_json("getDocuments", {"proposalNo": proposal_no})
+
+    # Lookup lists
+
+    async def get_list_of_status(self, workgroup_id=1) -> JSONValue:
+        """Get the possible status values."""
+        return await self.get_json("getListOfStatus", {"workgroupId": workgroup_id})
+
+    async def get_proposal_types(self, clearance_type_id=1) -> JSONValue:
+        """Get the proposal types of a clearance type."""
+        return await self.get_json("getProposalTypeOnBasesOfClearanceType", {"id": clearance_type_id})
+
+    async def get_all_states(self) -> JSONValue:
+        """Get the list of all states."""
+        return await self.get_json("getListOfAllState")
+
+    async def get_clearance_types(self) -> JSONValue:
+        """Get the list of all clearance types."""
+        return await self.get_json("getUGCStatus")
+
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import threading
+import time
+
+from db import connect
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding the shared token buckets
+DEFAULT_STATE_DB = "rate_limits.db"
+
+# Requests per second and burst size for a bucket with no entry below
+DEFAULT_RATE = (4.0, 8)
+
+# Per-bucket overrides; the host bucket caps all endpoints together
+BUCKET_RATES = {
+    "parivesh.nic.in": (10.0, 20),
+    "advanceSearchData": (2.0, 4),
+    "getKmlFile": (2.0, 4)
+}
+
+
+class TokenBucketLimiter:
+    """Token buckets shared by every process that points at the same state file.
+
+    Each bucket is a row in a small SQLite table holding its token count and
+    when it was last refilled. Taking a token is a single IMMEDIATE
+    transaction, so the importer, the checker and any number of crawlers
+    running side by side draw from the same budget.
+    """
+
+    def __init__(self, path=DEFAULT_STATE_DB, rates=None):
+        self.path = path
+        self.rates = dict(BUCKET_RATES, **(rates or {}))
+        self._lock = threading.Lock()
+        self._conn = connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS token_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        ''')
+
+    def close(self):
+        """Close the state database."""
+        with self._lock:
+            self._conn.close()
+
+    def rate(self, key):
+        """Return (tokens per second, burst size) for a bucket."""
+        return self.rates.get(key, DEFAULT_RATE)
+
+    def try_acquire(self, *keys):
+        """Take one token from every bucket in keys, all or nothing.
+
+        Returns 0 when the tokens were taken, otherwise the number of seconds
+        to wait before the slowest bucket has a token again.
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                levels = {}
+                wait = 0.0
+                for key in keys:
+                    rate, burst = self.rate(key)
+                    row = cursor.execute(
+                        "SELECT tokens, updated_at FROM token_buckets WHERE key = ?", (key,)
+                    ).fetchone()
+                    tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                    levels[key] = tokens
+                    if tokens < 1:
+                        wait = max(wait, (1 - tokens) / rate)
+
+                if wait == 0:
+                    for key, tokens in levels.items():
+                        levels[key] = tokens - 1
+
+                # Refilled levels are written back either way so the clock moves on
+                cursor.executemany('''
+                INSERT INTO token_buckets (key, tokens, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+                ''', [(key, tokens, now) for key, tokens in levels.items()])
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            return wait
+
+    def acquire_sync(self, *keys):
+        """Block until a token has been taken from every bucket in keys."""
+        while True:
+            wait = self.try_acquire(*keys)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire(self, *keys):
+        """Wait, without blocking the event loop, until a token has been taken from every bucket."""
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, *keys)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,202 @@
+import json
+import logging
+import struct
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# zlib only looks back 32 KiB, so a preset dictionary larger than that is wasted
+DICTIONARY_SIZE = 32 * 1024
+
+# Records a dictionary is trained on
+TRAIN_SAMPLES = 500
+
+# Fewer records than this, or a smaller dictionary, is not worth storing;
+# raw_json stays plain text until a later, larger load trains a real one
+MIN_TRAIN_SAMPLES = 100
+MIN_DICTIONARY_SIZE = 1024
+
+# Fragments longer than this are only kept by their prefix up to the last '/'
+MAX_FRAGMENT = 120
+
+# Header of a compressed payload: format version and dictionary ID
+HEADER = struct.Struct(">BI")
+FORMAT_VERSION = 1
+
+COMPRESSION_LEVEL = 9
+
+
+def train_dictionary(records, size=DICTIONARY_SIZE):
+    """Build a zlib preset dictionary from the JSON fragments that repeat across records.
+
+    Each record contributes its '"key": ' fragments, its short
+    '"key": value' pairs and, for long strings such as certificate URLs,
+    the value up to its last '/'. Fragments are ranked by the bytes they
+    would save and the best ones are placed at the end of the
+    dictionary, where zlib reaches them with the shortest distances.
+    """
+    counts = Counter()
+    for record in records:
+        if isinstance(record, (str, bytes)):
+            try:
+                record = json.loads(record)
+            except ValueError:
+                continue
+        if not isinstance(record, dict):
+            continue
+        for key, value in record.items():
+            prefix = json.dumps(key) + ": "
+            counts[prefix] += 1
+            pair = prefix + json.dumps(value)
+            if len(pair) <= MAX_FRAGMENT:
+                counts[pair] += 1
+            elif isinstance(value, str) and '/' in value:
+                counts[prefix + json.dumps(value[:value.rfind('/') + 1])[:-1]] += 1
+
+    fragments = sorted(
+        (fragment for fragment, count in counts.items() if count > 1),
+        key=lambda fragment: counts[fragment] * len(fragment),
+        reverse=True
+    )
+    chosen = []
+    total = 0
+    for fragment in fragments:
+        encoded = fragment.encode('utf-8')
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+class RawJsonCodec:
+    """Compresses proposal_details.raw_json with a dictionary trained on Parivesh records.
+
+    Dictionaries are kept in the compression_dictionaries table and a
+    compressed payload names the dictionary it was made with, so
+    retraining never makes older rows unreadable. Rows still stored as
+    plain JSON text are returned as they are.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.dictionary_id = None
+        self.dictionary = None
+        self._dictionaries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def create_table(conn):
+        """Create the compression_dictionaries table if needed; the caller commits."""
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS compression_dictionaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dictionary BLOB NOT NULL,
+            samples INTEGER NOT NULL,
+            created_at TIMESTAMP
+        )
+        ''')
+
+    @classmethod
+    def load(cls, conn):
+        """Load the newest usable dictionary; without one the codec leaves JSON uncompressed.
+
+        Dictionaries smaller than MIN_DICTIONARY_SIZE count as untrained,
+        though rows compressed with them can still be decoded.
+        """
+        codec = cls(conn)
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'compression_dictionaries'"
+        ).fetchone()
+        if not exists:
+            return codec
+        row = conn.execute(
+            "SELECT id, dictionary FROM compression_dictionaries WHERE length(dictionary) >= ? ORDER BY id DESC LIMIT 1",
+            (MIN_DICTIONARY_SIZE,)
+        ).fetchone()
+        if row:
+            codec.dictionary_id, codec.dictionary = row
+            codec._dictionaries[codec.dictionary_id] = codec.dictionary
+        return codec
+
+    def train(self, records):
+        """Train a dictionary on sample records, store it and use it from now on; the caller commits.
+
+        Returns the new dictionary ID, or None when the records were too
+        few, or too alike, to make a useful dictionary.
+        """
+        records = list(records)
+        if len(records) < MIN_TRAIN_SAMPLES:
+            logger.info(f"Only {len(records)} records to train a raw_json dictionary on, leaving raw_json uncompressed")
+            return None
+        dictionary = train_dictionary(records)
+        if len(dictionary) < MIN_DICTIONARY_SIZE:
+            logger.info(f"Trained raw_json dictionary is only {len(dictionary)} bytes, leaving raw_json uncompressed")
+            return None
+        cursor = self.conn.execute(
+            "INSERT INTO compression_dictionaries (dictionary, samples, created_at) VALUES (?, ?, ?)",
+            (dictionary, len(records), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        with self._lock:
+            self.dictionary_id = cursor.lastrowid
+            self.dictionary = dictionary
+            self._dictionaries[self.dictionary_id] = dictionary
+        logger.info(f"Trained a {len(dictionary)} byte raw_json dictionary on {len(records)} records")
+        return self.dictionary_id
+
+    def _get_dictionary(self, dictionary_id):
+        with self._lock:
+            dictionary = self._dictionaries.get(dictionary_id)
+        if dictionary is None:
+            row = self.conn.execute(
+                "SELECT dictionary FROM compression_dictionaries WHERE id = ?", (dictionary_id,)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Unknown raw_json dictionary {dictionary_id}")
+            dictionary = row[0]
+            with self._lock:
+                self._dictionaries[dictionary_id] = dictionary
+        return dictionary
+
+    def encode(self, text):
+        """Compress a JSON document; without a trained dictionary it is kept as text."""
+        if self.dictionary is None or text is None:
+            return text
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=self.dictionary)
+        data = text.encode('utf-8') if isinstance(text, str) else text
+        return HEADER.pack(FORMAT_VERSION, self.dictionary_id) + compressor.compress(data) + compressor.flush()
+
+    def decode(self, value):
+        """Return the JSON text of a stored raw_json value, compressed or not."""
+        if not isinstance(value, bytes):
+            return value
+        version, dictionary_id = HEADER.unpack_from(value)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unknown raw_json format version {version}")
+        decompressor = zlib.decompressobj(zdict=self._get_dictionary(dictionary_id))
+        return (decompressor.decompress(value[HEADER.size:]) + decompressor.flush()).decode('utf-8')
+
+    def loads(self, value):
+        """Return a stored raw_json value as the decoded record."""
+        text = self.decode(value)
+        return json.loads(text) if text is not None else None
+
+
+def register_functions(conn, codec=None):
+    """Make decode_raw_json() and encode_raw_json() available to SQL on a connection.
+
+    Without a codec, one is created on first use from the dictionaries
+    stored in the database.
+    """
+    state = {'codec': codec}
+
+    def get_codec():
+        if state['codec'] is None:
+            state['codec'] = RawJsonCodec.load(conn)
+        return state['codec']
+
+    conn.create_function("decode_raw_json", 1, lambda value: get_codec().decode(value), deterministic=True)
+    conn.create_function("encode_raw_json", 1, lambda value: get_codec().encode(value))
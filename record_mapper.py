@@ -0,0 +1,100 @@
+import json
+from datetime import datetime
+
+
+def proposal_year(proposal_id):
+    """Year a proposal was filed in, from the last four characters of its number."""
+    if not proposal_id or len(proposal_id) < 4:
+        return None
+    try:
+        return int(proposal_id[-4:])
+    except ValueError:
+        return datetime.now().year
+
+
+def to_int(value):
+    """Integer value of a record field, or None if it has none."""
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# The proposals columns and the advanceSearchData keys they are read from.
+# Where several keys are given the first one present is used; the optional
+# third item converts the value before it is stored.
+PROPOSAL_FIELDS = (
+    ("proposal_id", "proposalNo"),
+    ("sw_no", "singleWindowNumber"),
+    ("project_name", "projectName"),
+    ("company_name", "nameOfUserAgency"),
+    ("state", "state"),
+    ("category", "category"),
+    ("sector", "sector"),
+    ("current_status", "proposalStatus"),
+    ("proposal_type", "proposalType"),
+    ("clearance_type", "clearanceType"),
+    ("submission_date", "dateOfSubmission"),
+    ("last_updated", "app_updated_on"),
+    ("year", "proposalNo", proposal_year),
+    ("issuing_authority", "issuing_authority"),
+    ("caf_number", "cafnumber"),
+    ("form_id", ("form_id", "formId"), to_int),
+    ("certificate_url", "certificate_url")
+)
+
+
+def compile_row_builder(fields, name="build_row"):
+    """Compile a field mapping into a function that turns a record into a parameter tuple.
+
+    The function is generated once as straight-line code, one lookup per
+    column, so building a row costs no loop over the mapping and no
+    per-field dispatch. Its source is kept as the function's __source__.
+    """
+    namespace = {}
+    values = []
+    for position, field in enumerate(fields):
+        keys = field[1] if isinstance(field[1], tuple) else (field[1],)
+        value = " or ".join(f"get({key!r})" for key in keys)
+        if len(field) > 2:
+            namespace[f"convert_{position}"] = field[2]
+            value = f"convert_{position}({value})"
+        values.append(value)
+
+    source = f"def {name}(record):\n    get = record.get\n    return ({', '.join(values)},)\n"
+    exec(compile(source, f"<{name}>", "exec"), namespace)
+    builder = namespace[name]
+    builder.__source__ = source
+    return builder
+
+
+def upsert_sql(table, columns, conflict):
+    """INSERT for the given columns that updates the row on a conflict, but only if a value changed."""
+    updated = [column for column in columns if column not in conflict]
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})\n"
+        f"ON CONFLICT({', '.join(conflict)}) DO UPDATE SET\n    "
+        + ",\n    ".join(f"{column} = excluded.{column}" for column in updated)
+        + f"\nWHERE ({', '.join(updated)})\n"
+        f"    IS NOT ({', '.join(f'excluded.{column}' for column in updated)})\n"
+    )
+
+
+PROPOSAL_COLUMNS = tuple(field[0] for field in PROPOSAL_FIELDS)
+build_proposal_row = compile_row_builder(PROPOSAL_FIELDS, "build_proposal_row")
+
+# Upserts for the Level 1 tables; rows whose values did not change are left alone
+PROPOSAL_UPSERT = upsert_sql("proposals", PROPOSAL_COLUMNS, ("proposal_id",))
+PROPOSAL_DETAILS_UPSERT = upsert_sql("proposal_details", ("proposal_id", "raw_json"), ("proposal_id",))
+
+
+def proposal_record_rows(proposal, codec=None):
+    """Return the proposals row and the proposal_details row of an advanceSearchData record.
+
+    With a RawJsonCodec the raw JSON is stored compressed.
+    """
+    proposal_row = build_proposal_row(proposal)
+    raw_json = json.dumps(proposal)
+    if codec is not None:
+        raw_json = codec.encode(raw_json)
+    return proposal_row, (proposal_row[0], raw_json)
@@ -0,0 +1,191 @@
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Level 2 forms, in the order they are stored
+FORM_TYPES = ("caf", "part_a", "part_b", "part_c")
+
+# Endpoint behind each form
+FORM_ENDPOINTS = {
+    "caf": "getCaFormDetails",
+    "part_a": "getPartADetails",
+    "part_b": "getPartBDetails",
+    "part_c": "getPartCDetails"
+}
+
+# A form is skipped once it came back empty this many times, and never with data
+MIN_EMPTY_OBSERVATIONS = 5
+
+# One in this many skipped forms is fetched anyway, in case the form started to exist
+RECHECK_EVERY = 100
+
+# Every Level 2 call made for a proposal when nothing is known about it
+ALL_CALLS = ("getApprovalDates", "dataOfProposalNo", "getKmlFile", "getDocuments") + tuple(FORM_ENDPOINTS.values())
+
+
+class RequestPlan:
+    """The Level 2 endpoint calls needed for one proposal.
+
+    Built from what the Level 1 record already tells us: with its form_id
+    the location is a single getKmlFile call, with no dataOfProposalNo
+    first, and only the forms that exist for its clearance and proposal
+    type are requested. Endpoints in completed were imported by an earlier
+    run and are not called again. skipped lists the calls saved compared
+    to fetching everything.
+    """
+
+    def __init__(self, proposal_id, form_id=None, forms=FORM_TYPES, clearance_type=None, proposal_type=None,
+                 completed=()):
+        self.proposal_id = proposal_id
+        self.form_id = form_id
+        self.completed = frozenset(completed)
+        self.forms = tuple(form_type for form_type in forms if FORM_ENDPOINTS[form_type] not in self.completed)
+        self.skipped_forms = tuple(
+            form_type for form_type in FORM_TYPES
+            if form_type not in forms and FORM_ENDPOINTS[form_type] not in self.completed
+        )
+        self.clearance_type = clearance_type
+        self.proposal_type = proposal_type
+
+    def needs(self, endpoint):
+        """True if the endpoint still has to be called."""
+        return endpoint in self.calls
+
+    @property
+    def endpoints(self):
+        """Endpoints whose data the plan fetches."""
+        endpoints = [
+            endpoint for endpoint in ("getApprovalDates", "getKmlFile", "getDocuments")
+            if endpoint not in self.completed
+        ]
+        endpoints.extend(FORM_ENDPOINTS[form_type] for form_type in self.forms)
+        return endpoints
+
+    @property
+    def calls(self):
+        """Endpoint calls the plan makes, in no particular order."""
+        calls = self.endpoints
+        if "getKmlFile" in calls and self.form_id is None:
+            calls.append("dataOfProposalNo")
+        return calls
+
+    @property
+    def skipped(self):
+        """Calls left out compared to fetching everything."""
+        calls = self.calls
+        return [call for call in ALL_CALLS if call not in calls]
+
+
+def is_empty_form(data):
+    """True for a form response that holds nothing."""
+    if isinstance(data, dict) and 'data' in data:
+        data = data['data']
+    return not data
+
+
+class FormApplicability:
+    """Learns which forms exist for each clearance type and proposal type.
+
+    Counts, per (clearanceType, proposalType, form), how often the form
+    came back with data and how often empty. Forms that have only ever
+    come back empty are left out of later plans. The counts are kept in
+    the form_applicability table of the database.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self._dirty = set()
+        self._skips = 0
+        self._lock = threading.Lock()
+
+    def load(self, conn):
+        """Create the form_applicability table if needed and load the counts from it."""
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS form_applicability (
+            clearance_type TEXT NOT NULL,
+            proposal_type TEXT NOT NULL,
+            form_type TEXT NOT NULL,
+            present INTEGER NOT NULL DEFAULT 0,
+            empty INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (clearance_type, proposal_type, form_type)
+        )
+        ''')
+        cursor.execute("SELECT clearance_type, proposal_type, form_type, present, empty FROM form_applicability")
+        with self._lock:
+            for clearance_type, proposal_type, form_type, present, empty in cursor.fetchall():
+                self.counts[(clearance_type, proposal_type, form_type)] = [present, empty]
+        conn.commit()
+        return self
+
+    def save(self, cursor):
+        """Write the counts that changed since the last save; the caller commits."""
+        with self._lock:
+            rows = [key + tuple(self.counts[key]) for key in self._dirty]
+            self._dirty.clear()
+        if not rows:
+            return
+
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.executemany('''
+        INSERT INTO form_applicability (clearance_type, proposal_type, form_type, present, empty, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(clearance_type, proposal_type, form_type) DO UPDATE SET
+            present = excluded.present,
+            empty = excluded.empty,
+            updated_at = excluded.updated_at
+        ''', [row + (now,) for row in rows])
+
+    def observe(self, clearance_type, proposal_type, form_type, present):
+        """Record whether a form came back with data."""
+        key = (clearance_type or '', proposal_type or '', form_type)
+        with self._lock:
+            counts = self.counts.setdefault(key, [0, 0])
+            counts[0 if present else 1] += 1
+            self._dirty.add(key)
+
+    def is_applicable(self, clearance_type, proposal_type, form_type):
+        """False once a form is known to come back empty for this kind of proposal."""
+        present, empty = self.counts.get((clearance_type or '', proposal_type or '', form_type), (0, 0))
+        return present > 0 or empty < MIN_EMPTY_OBSERVATIONS
+
+    def applicable_forms(self, clearance_type, proposal_type):
+        """Return the forms worth requesting for a clearance type and proposal type."""
+        forms = []
+        for form_type in FORM_TYPES:
+            if not self.is_applicable(clearance_type, proposal_type, form_type):
+                with self._lock:
+                    self._skips += 1
+                    recheck = self._skips % RECHECK_EVERY == 0
+                if not recheck:
+                    continue
+            forms.append(form_type)
+        return forms
+
+
+def plan_requests(proposal, applicability=None, completed=()):
+    """Work out the Level 2 calls needed for an advanceSearchData record.
+
+    With a FormApplicability, forms known to be empty for the record's
+    clearance type and proposal type are left out; endpoints in completed
+    are left out too.
+    """
+    form_id = proposal.get('form_id') or proposal.get('formId')
+    clearance_type = proposal.get('clearanceType')
+    proposal_type = proposal.get('proposalType')
+
+    forms = FORM_TYPES
+    if applicability is not None:
+        forms = applicability.applicable_forms(clearance_type, proposal_type)
+
+    return RequestPlan(
+        proposal.get('proposalNo'),
+        form_id=form_id,
+        forms=forms,
+        clearance_type=clearance_type,
+        proposal_type=proposal_type,
+        completed=completed
+    )
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from db import connect
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding the cached responses
+DEFAULT_CACHE_DB = "response_cache.db"
+
+# Total size of cached bodies kept before the least recently used are evicted
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Seconds a cached response is served without asking the server again. Once
+# it is older it is revalidated with a conditional request. Endpoints not
+# listed here are never cached.
+ENDPOINT_TTLS = {
+    "dataOfProposalNo": 24 * 3600,
+    "getApprovalDates": 6 * 3600,
+    "getKmlFile": 30 * 24 * 3600,
+    "getCaFormDetails": 7 * 24 * 3600,
+    "getPartADetails": 7 * 24 * 3600,
+    "getPartBDetails": 7 * 24 * 3600,
+    "getPartCDetails": 7 * 24 * 3600,
+    "getDocuments": 24 * 3600,
+    "getListOfStatus": 7 * 24 * 3600,
+    "getProposalTypeOnBasesOfClearanceType": 7 * 24 * 3600,
+    "getListOfAllState": 30 * 24 * 3600,
+    "getUGCStatus": 30 * 24 * 3600
+}
+
+
+class CachedResponse:
+    """A cached response body with its validators."""
+
+    def __init__(self, key, body, etag, last_modified, fetched_at):
+        self.key = key
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, ttl):
+        """True if the response is young enough to be used without revalidating."""
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self):
+        """Headers that ask the server to answer 304 if nothing has changed."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """Persistent cache of API responses keyed by endpoint and params.
+
+    Responses are kept in a SQLite table together with their ETag and
+    Last-Modified headers. A response younger than its endpoint's TTL is
+    served straight from the cache; an older one is revalidated with a
+    conditional request, and a 304 just renews it. When the cached bodies
+    grow past max_bytes the least recently used are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_DB, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttls = dict(ENDPOINT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            endpoint TEXT NOT NULL,
+            body TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            size INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses(accessed_at)")
+        # Size of all cached bodies, summed once here and then kept up to date by put_sync and _evict
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self):
+        """Close the cache database."""
+        with self._lock:
+            self._conn.close()
+
+    def ttl(self, endpoint):
+        """Return the TTL of an endpoint, or None if it is not cached."""
+        return self.ttls.get(endpoint)
+
+    @staticmethod
+    def make_key(endpoint, params=None):
+        """Build the cache key of a request from its endpoint and params."""
+        return f"{endpoint}?{json.dumps(params or {}, sort_keys=True, default=str)}"
+
+    def get_sync(self, key):
+        """Return the cached response for key, or None, and mark it as used."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return CachedResponse(key, *row)
+
+    def put_sync(self, key, endpoint, body, etag=None, last_modified=None):
+        """Store a response, then evict old ones if the cache has grown too big."""
+        now = time.time()
+        size = len(body.encode("utf-8"))
+        with self._lock:
+            replaced = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute('''
+            INSERT INTO responses (key, endpoint, body, etag, last_modified, size, fetched_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                body = excluded.body,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                size = excluded.size,
+                fetched_at = excluded.fetched_at,
+                accessed_at = excluded.accessed_at
+            ''', (key, endpoint, body, etag, last_modified, size, now, now))
+            self._total_bytes += size - (replaced[0] if replaced else 0)
+            self._evict()
+
+    def touch_sync(self, key):
+        """Renew a cached response after the server confirmed it is unchanged."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?", (now, now, key)
+            )
+
+    def _evict(self):
+        """Delete the least recently used responses until the cache fits in max_bytes."""
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        excess = self._total_bytes - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self._total_bytes -= freed
+        logger.info(f"Evicted {len(stale)} cached responses ({freed} bytes)")
+
+    async def get(self, key):
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def put(self, key, endpoint, body, etag=None, last_modified=None):
+        await asyncio.to_thread(self.put_sync, key, endpoint, body, etag, last_modified)
+
+    async def touch(self, key):
+        await asyncio.to_thread(self.touch_sync, key)
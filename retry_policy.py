@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Response statuses worth retrying; anything else is the server's final answer
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"Circuit for {endpoint} is open, retry in {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honours Retry-After."""
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30.0, max_retry_after=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def is_retryable(self, error):
+        """True for timeouts, dropped connections and retryable statuses."""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in RETRYABLE_STATUSES
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the given retry (1 for the first retry)."""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header, given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class CircuitBreaker:
+    """Stops calls to an endpoint after repeated failures.
+
+    After failure_threshold failures in a row the circuit opens and calls
+    are refused for reset_timeout seconds. Then a single trial call is let
+    through; its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def retry_in(self):
+        """Seconds until the next trial call is allowed."""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self):
+        """True if a call may go ahead now."""
+        if self.opened_at is None:
+            return True
+        if self.retry_in() > 0 or self.trial_in_flight:
+            return False
+        self.trial_in_flight = True
+        return True
+
+    def release_trial(self):
+        """Give up a trial call that ended without an answer, e.g. because it was cancelled."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed again")
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
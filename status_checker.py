@@ -1,10 +1,13 @@
-import sqlite3
+import asyncio
 import logging
-import json
-import requests
 import time
 from datetime import datetime
 
+from crawler import crawl_proposals
+from db import connect
+from db_schema import migrate
+from parivesh_client import PariveshClient
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,119 +19,86 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def fetch_current_proposals(state_id, year):
+    """Crawl every page of current proposals for a state and year."""
+    async with PariveshClient() as client:
+        return await crawl_proposals(
+            client,
+            state_id,
+            year,
+            major_clearance_type=1  # Environmental Clearance
+        )
+
 def check_for_updates(db_path, state_id=36, year=2024):
     """Check for new proposals and status changes."""
     logger.info(f"Checking for updates in {state_id} for {year}")
     
     # Connect to database
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
+    migrate(conn)
     
     # Get existing proposals
     cursor.execute("SELECT proposal_id, current_status FROM proposals")
     existing_proposals = {row[0]: row[1] for row in cursor.fetchall()}
     
-    # Create a session for API requests
-    session = requests.Session()
-    
-    # Headers that mimic a browser
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
-        "Accept": "application/json, text/plain, */*",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Origin": "https://parivesh.nic.in",
-        "Referer": "https://parivesh.nic.in/",
-        "Connection": "keep-alive"
-    }
-    
-    # Visit the main page to get cookies
-    session.get("https://parivesh.nic.in", headers=headers)
-    
-    # Search for proposals
-    url = "https://parivesh.nic.in/parivesh_api/trackYourProposal/advanceSearchData"
-    params = {
-        "majorClearanceType": 1,  # Environmental Clearance
-        "state": state_id,
-        "sector": "",
-        "proposalStatus": "",
-        "proposalType": "",
-        "issuingAuthority": "",
-        "activityId": "",
-        "category": "",
-        "startDate": "",
-        "endDate": "",
-        "areaMin": "",
-        "areaMax": "",
-        "text": "",
-        "area": "",
-        "year": year,
-        "page": 0,
-        "size": 1000
-    }
-    
     try:
-        response = session.get(url, params=params, headers=headers, timeout=60)
-        if response.status_code == 200:
-            data = response.json()
+        current_proposals = asyncio.run(fetch_current_proposals(state_id, year))
+        if current_proposals:
+            # Check for new proposals and status changes
+            new_proposals = []
+            status_changes = []
             
-            if isinstance(data, dict) and 'data' in data and isinstance(data['data'], list):
-                current_proposals = data['data']
+            for proposal in current_proposals:
+                proposal_id = proposal.get('proposalNo')
+                if not proposal_id:
+                    continue
                 
-                # Check for new proposals and status changes
-                new_proposals = []
-                status_changes = []
+                current_status = proposal.get('proposalStatus', '')
                 
-                for proposal in current_proposals:
-                    proposal_id = proposal.get('proposalNo')
-                    if not proposal_id:
-                        continue
-                    
-                    current_status = proposal.get('proposalStatus', '')
-                    
-                    if proposal_id not in existing_proposals:
-                        # New proposal
-                        new_proposals.append(proposal)
-                        logger.info(f"New proposal found: {proposal_id} with status {current_status}")
-                    elif existing_proposals[proposal_id] != current_status:
-                        # Status change
-                        status_changes.append({
-                            'proposal_id': proposal_id,
-                            'old_status': existing_proposals[proposal_id],
-                            'new_status': current_status
-                        })
-                        logger.info(f"Status change for {proposal_id}: {existing_proposals[proposal_id]} -> {current_status}")
-                
-                # Process new proposals
-                if new_proposals:
-                    logger.info(f"Processing {len(new_proposals)} new proposals")
-                    for proposal in new_proposals:
-                        # Code to insert new proposal into database
-                        # This would call functions from final_import.py
-                        pass
-                
-                # Process status changes
-                if status_changes:
-                    logger.info(f"Processing {len(status_changes)} status changes")
-                    for change in status_changes:
-                        # Update status in database
-                        cursor.execute(
-                            "UPDATE proposals SET current_status = ? WHERE proposal_id = ?",
-                            (change['new_status'], change['proposal_id'])
-                        )
-                        
-                        # Add to timeline
-                        cursor.execute(
-                            "INSERT INTO proposal_timelines (proposal_id, status, date, remarks) VALUES (?, ?, ?, ?)",
-                            (change['proposal_id'], change['new_status'], datetime.now().strftime("%Y-%m-%d"), "Status updated by checker")
-                        )
+                if proposal_id not in existing_proposals:
+                    # New proposal
+                    new_proposals.append(proposal)
+                    logger.info(f"New proposal found: {proposal_id} with status {current_status}")
+                elif existing_proposals[proposal_id] != current_status:
+                    # Status change
+                    status_changes.append({
+                        'proposal_id': proposal_id,
+                        'old_status': existing_proposals[proposal_id],
+                        'new_status': current_status
+                    })
+                    logger.info(f"Status change for {proposal_id}: {existing_proposals[proposal_id]} -> {current_status}")
+            
+            # Process new proposals
+            if new_proposals:
+                logger.info(f"Processing {len(new_proposals)} new proposals")
+                for proposal in new_proposals:
+                    # Code to insert new proposal into database
+                    # This would call functions from final_import.py
+                    pass
+            
+            # Process status changes
+            if status_changes:
+                logger.info(f"Processing {len(status_changes)} status changes")
+                for change in status_changes:
+                    # Update status in database
+                    cursor.execute(
+                        "UPDATE proposals SET current_status = ? WHERE proposal_id = ?",
+                        (change['new_status'], change['proposal_id'])
+                    )
                     
-                    conn.commit()
+                    # Add to timeline
+                    cursor.execute(
+                        "INSERT INTO proposal_timelines (proposal_id, status, date, remarks) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(proposal_id, status, date) DO NOTHING",
+                        (change['proposal_id'], change['new_status'], datetime.now().strftime("%Y-%m-%d"), "Status updated by checker")
+                    )
                 
-                logger.info(f"Found {len(new_proposals)} new proposals and {len(status_changes)} status changes")
-            else:
-                logger.warning("Unexpected response format")
+                conn.commit()
+            
+            logger.info(f"Found {len(new_proposals)} new proposals and {len(status_changes)} status changes")
         else:
-            logger.error(f"Failed to get proposals: {response.status_code}")
+            logger.warning("No proposals retrieved")
     
     except Exception as e:
         logger.error(f"Error checking for updates: {str(e)}")
@@ -140,7 +110,6 @@ def check_for_updates(db_path, state_id=36, year=2024):
 
 if __name__ == "__main__":
     import sys
-    import time
     
     db_path = "parivesh.db"
     check_interval_hours = 24
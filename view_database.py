@@ -1,16 +1,18 @@
-import sqlite3
 import os
 import sys
 import datetime
 
+from db import connect_readonly
+
 def generate_html_table(cursor, table_name):
     """Generate HTML table for the given table name."""
     # Get column names
     cursor.execute(f"PRAGMA table_info({table_name})")
     columns = [row[1] for row in cursor.fetchall()]
     
-    # Get data
-    cursor.execute(f"SELECT * FROM {table_name} LIMIT 100")
+    # Get data; raw_json is stored compressed and decoded for display
+    select_list = ", ".join("decode_raw_json(raw_json)" if col == "raw_json" else col for col in columns)
+    cursor.execute(f"SELECT {select_list} FROM {table_name} LIMIT 100")
     rows = cursor.fetchall()
     
     # Generate HTML
@@ -76,7 +78,7 @@ def export_database_to_html(db_path, output_path=None):
         output_path = f"database_view_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         # Get table names